@@ -0,0 +1,171 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from compiler import PARSERS, compile_program, get_parser_class
+from pass_manager import LEVELS
+from transition_diagram_parser import get_grammar
+
+PASSES = sorted(set(LEVELS[2]) | {"live_saves"})
+parser_class = None
+
+
+def init_worker(parser_name):
+    global parser_class
+    get_grammar()
+    parser_class = get_parser_class(parser_name)
+
+
+def collect_inputs(paths, pattern="*.txt"):
+    inputs = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            inputs.extend(sorted(path.rglob(pattern)))
+        else:
+            inputs.append(path)
+    return inputs
+
+
+def output_dirs(inputs, output_root):
+    dirs = []
+    used = set()
+    for path in inputs:
+        name = path.stem
+        suffix = 1
+        while name in used:
+            suffix += 1
+            name = f"{path.stem}-{suffix}"
+        used.add(name)
+        dirs.append(Path(output_root) / name)
+    return dirs
+
+
+def compile_job(job):
+    input_path, output_dir, options = job
+    result = {
+        "input": str(input_path),
+        "output": str(output_dir),
+        "errors": [],
+        "exception": None,
+        "report": "",
+    }
+    start = time.perf_counter()
+    report = io.StringIO()
+    try:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        with contextlib.redirect_stdout(report):
+            errors = compile_program(parser_class, input_path, output_dir, **options)
+        result["errors"] = [str(error) for error in errors]
+        if errors:
+            with open(Path(output_dir) / "errors.txt", "w") as f:
+                f.writelines(f"{error}\n" for error in result["errors"])
+    except Exception:
+        result["exception"] = traceback.format_exc()
+    result["seconds"] = time.perf_counter() - start
+    result["report"] = report.getvalue()
+    return result
+
+
+def compile_batch(
+    paths,
+    output_root="build",
+    jobs=None,
+    parser_name="recursive",
+    pattern="*.txt",
+    **options,
+):
+    start = time.perf_counter()
+    inputs = collect_inputs(paths, pattern)
+    work = [
+        (input_path, output_dir, options)
+        for input_path, output_dir in zip(inputs, output_dirs(inputs, output_root))
+    ]
+    jobs = jobs or os.cpu_count() or 1
+    init_worker(parser_name)
+    if jobs == 1 or len(work) <= 1:
+        results = list(map(compile_job, work))
+    else:
+        chunksize = max(1, len(work) // (jobs * 8))
+        with ProcessPoolExecutor(
+            jobs, initializer=init_worker, initargs=(parser_name,)
+        ) as executor:
+            results = list(executor.map(compile_job, work, chunksize=chunksize))
+    seconds = [result["seconds"] for result in results]
+    summary = {
+        "files": len(results),
+        "failed": sum(result["exception"] is not None for result in results),
+        "with_errors": sum(bool(result["errors"]) for result in results),
+        "syntax_errors": sum(len(result["errors"]) for result in results),
+        "jobs": jobs,
+        "wall_seconds": time.perf_counter() - start,
+        "compile_seconds": sum(seconds),
+        "max_seconds": max(seconds, default=0),
+        "results": results,
+    }
+    Path(output_root).mkdir(parents=True, exist_ok=True)
+    with open(Path(output_root) / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def print_summary(summary):
+    for result in summary["results"]:
+        if result["exception"] is not None:
+            last_line = result["exception"].strip().splitlines()[-1]
+            print(f"{result['input']}: failed: {last_line}")
+        elif result["errors"]:
+            print(f"{result['input']}: {len(result['errors'])} syntax errors")
+    files = summary["files"]
+    print(
+        f"Compiled {files} files with {summary['jobs']} workers "
+        f"in {summary['wall_seconds']:.2f} s"
+    )
+    print(
+        f"{summary['failed']} failed, {summary['with_errors']} with syntax errors "
+        f"({summary['syntax_errors']} errors)"
+    )
+    if files:
+        print(
+            f"Compile time: {summary['compile_seconds'] / files * 1000:.1f} ms mean, "
+            f"{summary['max_seconds'] * 1000:.1f} ms max"
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("paths", nargs="+")
+    arg_parser.add_argument("-o", "--output", default="build")
+    arg_parser.add_argument("-j", "--jobs", type=int)
+    arg_parser.add_argument("--pattern", default="*.txt")
+    arg_parser.add_argument(
+        "--parser", choices=[*PARSERS, "generated"], default="recursive"
+    )
+    arg_parser.add_argument("--stream", action="store_true")
+    arg_parser.add_argument("--no-tree", action="store_true")
+    arg_parser.add_argument("-O", dest="level", type=int, choices=LEVELS, default=0)
+    arg_parser.add_argument(
+        "--pass", dest="passes", action="append", choices=PASSES, default=[]
+    )
+    arg_parser.add_argument("--source-map", action="store_true")
+    args = arg_parser.parse_args()
+    summary = compile_batch(
+        args.paths,
+        args.output,
+        args.jobs,
+        args.parser,
+        args.pattern,
+        stream=args.stream,
+        build_tree=not args.no_tree,
+        level=args.level,
+        passes=args.passes,
+        source_map=args.source_map,
+    )
+    print_summary(summary)
+    sys.exit(1 if summary["failed"] else 0)
@@ -1,3 +1,34 @@
+import json
+
+ARITHMETIC_OPS = frozenset(["ADD", "SUB", "MULT", "EQ", "LT"])
+FOLDS = {
+    "ADD": lambda left, right: left + right,
+    "SUB": lambda left, right: left - right,
+    "MULT": lambda left, right: left * right,
+    "EQ": lambda left, right: int(left == right),
+    "LT": lambda left, right: int(left < right),
+}
+WORD_BITS = 32
+UNROLLED_FILL_LIMIT = 6
+ACTION_ALIASES = {"break": "save_break"}
+
+
+def fits_word(value):
+    return -(1 << (WORD_BITS - 1)) <= value < 1 << (WORD_BITS - 1)
+
+
+def to_word(value):
+    return (value + (1 << (WORD_BITS - 1))) % (1 << WORD_BITS) - (1 << (WORD_BITS - 1))
+
+
+def get_action_name(action):
+    name = action[1:] if action[0] == "#" else action
+    name = ACTION_ALIASES.get(name, name)
+    if name.startswith("_") or not callable(getattr(CodeGenerator, name, None)):
+        raise Exception(f"Invalid action {action}")
+    return name
+
+
 class CodeGenerator:
     def __init__(self, parser, lexer):
         self.parser = parser
@@ -7,11 +38,16 @@ class CodeGenerator:
         self.break_scope = list()
         self.break_stack = list()
 
-        self.temp_pointer = 500
+        self.temp_start = 500
+        self.temp_pointer = self.temp_start
 
         self.stack_pointer = 100
         self.return_address = 104
         self.print_param = 108
+        self.frame_pointer = 112
+        self.scratch = [116, 120, 124]
+        self.return_value = 128
+        self.array_fill = [132, 136, 140]
 
         self.scope_stack = [
             {
@@ -38,7 +74,24 @@ class CodeGenerator:
             9: ("ASSIGN", "#4000", self.stack_pointer, None),
             10: ("ASSIGN", "#0", self.return_address, None),
         }
+        self.source_map = {line: (None, None) for line in self.codes_generated}
+        for line in range(1, 9):
+            self.source_map[line] = (None, "output")
         self.waiting_function_jumps = {}
+        self.expression_temps = set()
+        self.code_address_lines = set()
+        self.call_sites = []
+        self.functions = []
+        self.array_base_lines = set()
+        self.fold_constants = False
+        self.constants = {}
+        self.reuse_temps = False
+        self.free_temps = {}
+        self.temp_lengths = {}
+        self.pending_temps = {}
+        self.reduce_indexing = False
+        self.addresses = {}
+        self.array_lengths = {}
 
         self.program_line = len(self.codes_generated)
 
@@ -64,15 +117,89 @@ class CodeGenerator:
         self.scope_stack[scope_indicator][var]["type"] = type
         return address
 
+    def mark_source(self, line):
+        self.source_map[int(line)] = (self.lexer.lineno, self.current_function_name)
+
     def add_code_line(self, code):
         self.codes_generated[int(self.program_line)] = code
+        self.mark_source(self.program_line)
         self.program_line += 1
+        if self.constants:
+            self.invalidate_constants(code)
+        if self.addresses:
+            self.invalidate_addresses(code)
+
+    def invalidate_constants(self, code):
+        if code[0] == "JP":
+            self.constants.clear()
+            return
+        if code[0] == "ASSIGN":
+            target = code[2]
+        elif code[0] in ARITHMETIC_OPS:
+            target = code[3]
+        else:
+            return
+        if isinstance(target, str) and target.startswith("@"):
+            self.constants.clear()
+        else:
+            self.constants.pop(int(target), None)
+
+    def invalidate_addresses(self, code):
+        if code[0] == "JP":
+            self.addresses.clear()
+            return
+        if code[0] == "ASSIGN":
+            target = code[2]
+        elif code[0] in ARITHMETIC_OPS:
+            target = code[3]
+        else:
+            return
+        for (array, index), address in list(self.addresses.items()):
+            if isinstance(target, str) and target.startswith("@"):
+                stale = index.isdigit() and self.is_element(int(index))
+            else:
+                stale = str(target) in [array, index, str(address)]
+            if stale:
+                del self.addresses[(array, index)]
+
+    def start_block(self):
+        self.constants.clear()
+        self.addresses.clear()
+
+    def is_element(self, address):
+        return any(
+            base < address <= base + 4 * length
+            for base, length in self.array_lengths.items()
+        )
+
+    def set_constant(self, address, value):
+        if self.fold_constants and not str(address).startswith("@"):
+            if str(value).startswith("#") and fits_word(int(value[1:])):
+                self.constants[int(address)] = int(value[1:])
+
+    def get_value(self, operand):
+        if self.constants and isinstance(operand, (int, str)):
+            if str(operand).isdigit() and int(operand) in self.constants:
+                return f"#{self.constants[int(operand)]}"
+        return operand
+
+    def fold(self, op, left, right):
+        if not self.fold_constants:
+            return None
+        if not (str(left).startswith("#") and str(right).startswith("#")):
+            return None
+        left, right = int(left[1:]), int(right[1:])
+        if not (fits_word(left) and fits_word(right)):
+            return None
+        return f"#{to_word(FOLDS[op](left, right))}"
 
     def store_code_line(self, code, line):
         if isinstance(line, str):
             if line.startswith("#") or line.startswith("@"):
                 line = line[1:]
         self.codes_generated[int(line)] = code
+        if int(line) not in self.source_map:
+            self.mark_source(line)
 
     def push_to_stack(self, addr):
         self.add_code_line(("ASSIGN", addr, f"@{self.stack_pointer}", None))
@@ -82,115 +209,65 @@ class CodeGenerator:
         self.add_code_line(("SUB", self.stack_pointer, "#4", self.stack_pointer))
         self.add_code_line(("ASSIGN", f"@{self.stack_pointer}", write_back_addr, None))
 
+    def get_action_handlers(self, actions):
+        return {action: getattr(self, get_action_name(action)) for action in actions}
+
     def code_gen(self, action):
-        if action[0] == "#":
-            action = action[1:]
-
-        if action == "get_temp":
-            self.get_temp()
-        elif action == "p_id":
-            self.p_id(self.last_id)
-        elif action == "p_num":
-            self.p_num(self.last_num)
-        elif action == "add":
-            self.add()
-        elif action == "sub":
-            self.sub()
-        elif action == "mult":
-            self.mult()
-        elif action == "arithmetic":
-            self.arithmetic()
-        elif action == "assign":
-            self.assign()
-        elif action == "eq":
-            self.eq()
-        elif action == "lt":
-            self.lt()
-        elif action == "declare_var":
-            self.declare_var()
-        elif action == "declare_array":
-            self.declare_array()
-        elif action == "compare":
-            self.compare()
-        elif action == "label":
-            self.label()
-        elif action == "save":
-            self.save()
-        elif action == "jp":
-            self.jp()
-        elif action == "jpf":
-            self.jpf()
-        elif action == "jpf_save":
-            self.jpf_save()
-        elif action == "call":
-            self.call()
-        elif action == "array_index":
-            self.array_index()
-        elif action == "exp_end":
-            self.exp_end()
-        elif action == "break":
-            self.save_break()
-        elif action == "jp_break":
-            self.jp_break()
-        elif action == "scope_enter":
-            self.scope_enter()
-        elif action == "scope_exit":
-            self.scope_exit()
-        elif action == "declaring_function":
-            self.declaring_function()
-        elif action == "start_declaring_params":
-            self.start_declaring_params()
-        elif action == "end_declaring_params":
-            self.end_declaring_params()
-        elif action == "signature_declared":
-            self.signature_declared()
-        elif action == "declare_array_param":
-            self.declare_array_param()
-        elif action == "declare_int_param":
-            self.declare_int_param()
-        elif action == "function_declared":
-            self.function_declared()
-        elif action == "push_return_address":
-            self.push_return_address()
-        elif action == "pop_return_address":
-            self.pop_return_address()
-        elif action == "push_return_value":
-            self.push_return_value()
-        elif action == "pop_return_value":
-            self.pop_return_value()
-        elif action == "push_state":
-            self.push_state()
-        elif action == "pop_state":
-            self.pop_state()
-        elif action == "return_void":
-            self.return_void()
-        elif action == "return_int":
-            self.return_int()
-        elif action == "default_return":
-            self.default_return()
-        elif action == "push_arg":
-            self.push_arg()
-        elif action == "pop_args":
-            self.pop_args()
-        else:
-            print(action)
-            raise Exception("Invalid action")
+        getattr(self, get_action_name(action))()
 
     def get_temp(self, length=1, size=4):
-        address = self.temp_pointer
-        self.temp_pointer += length * size
+        if self.free_temps.get(length):
+            address = self.free_temps[length].pop()
+        else:
+            address = self.temp_pointer
+            self.temp_pointer += length * size
+        self.temp_lengths[address] = length
         self.address_scope_stack[-1].append(address)
         return address
 
-    def p_id(self, id):
+    def get_expression_temp(self):
+        address = self.get_temp()
+        self.expression_temps.add(address)
+        self.pending_temps[address] = 1
+        return address
+
+    def get_scratch_temp(self):
+        address = self.get_expression_temp()
+        self.address_scope_stack[-1].remove(address)
+        return address
+
+    def free_temp(self, address):
+        if not self.reuse_temps:
+            return
+        length = self.temp_lengths.pop(address, 1)
+        for key, temp in list(self.addresses.items()):
+            if temp == address:
+                del self.addresses[key]
+        self.free_temps.setdefault(length, []).append(address)
+        for address_scope in reversed(self.address_scope_stack):
+            if address in address_scope:
+                address_scope.remove(address)
+                break
+
+    def use(self, operand):
+        address = str(operand).lstrip("@")
+        if address.isdigit() and int(address) in self.pending_temps:
+            self.pending_temps[int(address)] -= 1
+            if not self.pending_temps[int(address)]:
+                del self.pending_temps[int(address)]
+                self.free_temp(int(address))
+        return self.get_value(operand)
+
+    def p_id(self):
+        id = self.last_id
         if self.last_type is not None:
             self.semantic_stack.append(id)
         else:
             scope, address = self.get_var_scope(id)
             self.semantic_stack.append(str(address))
 
-    def p_num(self, num):
-        self.semantic_stack.append("#" + str(num))
+    def p_num(self):
+        self.semantic_stack.append("#" + str(self.last_num))
 
     def add(self):
         self.semantic_stack.append("ADD")
@@ -202,17 +279,22 @@ class CodeGenerator:
         self.semantic_stack.append("MULT")
 
     def arithmetic(self):
-        right = self.semantic_stack.pop()
+        right = self.use(self.semantic_stack.pop())
         op = self.semantic_stack.pop()
-        left = self.semantic_stack.pop()
-        result = self.get_temp()
+        left = self.use(self.semantic_stack.pop())
+        folded = self.fold(op, left, right)
+        if folded is not None:
+            self.semantic_stack.append(folded)
+            return
+        result = self.get_expression_temp()
         self.add_code_line((op, left, right, result))
         self.semantic_stack.append(result)
 
     def assign(self):
-        right = self.semantic_stack.pop()
+        right = self.use(self.semantic_stack.pop())
         left = self.semantic_stack.pop()
         self.add_code_line(("ASSIGN", right, left, None))
+        self.set_constant(left, right)
         self.semantic_stack.append(left)
 
     def eq(self):
@@ -225,6 +307,7 @@ class CodeGenerator:
         id = self.semantic_stack.pop()
         address = self.add_var_to_scope(id, -1, "int")
         self.add_code_line(("ASSIGN", "#0", address, None))
+        self.set_constant(address, "#0")
         self.scope_stack[-1][self.last_id] = dict()
         self.scope_stack[-1][self.last_id]["addr"] = address
         self.scope_stack[-1][self.last_id]["type"] = self.last_type
@@ -234,42 +317,65 @@ class CodeGenerator:
         length = int(self.semantic_stack.pop()[1:])
         id = self.semantic_stack.pop()
         address = self.add_var_to_scope(id, -1, "array", length + 1)
+        self.array_lengths[address] = length
+        self.array_base_lines.add(self.program_line)
         self.add_code_line(("ASSIGN", f"#{address + 4}", address, None))
-        for i in range(length):
-            self.add_code_line(("ASSIGN", "#0", address + 4 + i * 4, None))
+        if length <= UNROLLED_FILL_LIMIT:
+            for i in range(length):
+                self.add_code_line(("ASSIGN", "#0", address + 4 + i * 4, None))
+        else:
+            self.fill_array(address, length)
         self.scope_stack[-1][self.last_id] = dict()
         self.scope_stack[-1][self.last_id]["addr"] = address
         self.scope_stack[-1][self.last_id]["type"] = "array"
         self.last_type = None
 
+    def fill_array(self, address, length):
+        pointer, end, done = self.array_fill
+        self.add_code_line(("ADD", address, f"#{length * 4}", end))
+        self.add_code_line(("ASSIGN", address, pointer, None))
+        loop = self.program_line
+        self.add_code_line(("ASSIGN", "#0", f"@{pointer}", None))
+        self.add_code_line(("ADD", pointer, "#4", pointer))
+        self.add_code_line(("EQ", pointer, end, done))
+        self.add_code_line(("JPF", done, loop, None))
+
     def compare(self):
-        right = self.semantic_stack.pop()
+        right = self.use(self.semantic_stack.pop())
         op = self.semantic_stack.pop()
-        left = self.semantic_stack.pop()
-        result = self.get_temp()
+        left = self.use(self.semantic_stack.pop())
+        folded = self.fold(op, left, right)
+        if folded is not None:
+            self.semantic_stack.append(folded)
+            return
+        result = self.get_expression_temp()
         self.add_code_line((op, left, right, result))
         self.semantic_stack.append(result)
 
     def label(self):
+        self.start_block()
         self.semantic_stack.append(self.program_line)
         self.break_scope.append(len(self.scope_stack))
 
     def save(self):
         self.label()
+        self.mark_source(self.program_line)
         self.program_line += 1
 
     def jp(self):
+        self.start_block()
         code_line = self.semantic_stack.pop()
         self.store_code_line(("JP", self.program_line, None, None), code_line)
 
     def jpf(self):
-        condition = self.semantic_stack.pop()
+        condition = self.use(self.semantic_stack.pop())
         jump_address = self.semantic_stack.pop()
         self.add_code_line(("JPF", condition, jump_address, None))
 
     def jpf_save(self):
+        self.start_block()
         code_line = self.semantic_stack.pop()
-        condition = self.semantic_stack.pop()
+        condition = self.use(self.semantic_stack.pop())
         self.store_code_line(("JPF", condition, self.program_line + 1, None), code_line)
         self.save()
 
@@ -279,23 +385,51 @@ class CodeGenerator:
 
     def array_index(self):
         index = self.semantic_stack.pop()
+        shared = isinstance(index, str) and index.lstrip("#").isdigit()
+        index = self.use(index)
         array = self.semantic_stack.pop()
-        result = self.get_temp()
-        self.add_code_line(("MULT", index, "#4", result))
-        self.add_code_line(("ADD", f"{array}", result, result))
+        if self.reduce_indexing:
+            address = self.element_address(array, index)
+            if address is not None:
+                self.semantic_stack.append(address)
+                return
+            if (array, index) in self.addresses:
+                result = self.addresses[(array, index)]
+                self.pending_temps[result] = self.pending_temps.get(result, 0) + 1
+                self.semantic_stack.append("@" + str(result))
+                return
+        offset = self.fold("MULT", index, "#4")
+        if offset is None:
+            product = self.get_scratch_temp()
+            self.add_code_line(("MULT", index, "#4", product))
+            offset = self.use(product)
+        result = self.get_expression_temp()
+        self.add_code_line(("ADD", f"{array}", offset, result))
+        if self.reduce_indexing and shared:
+            self.addresses[(array, index)] = result
         self.semantic_stack.append("@" + str(result))
 
+    def element_address(self, array, index):
+        if not str(array).isdigit() or not str(index).startswith("#"):
+            return None
+        length = self.array_lengths.get(int(array))
+        if length is None or not 0 <= int(index[1:]) < length:
+            return None
+        return str(int(array) + 4 + int(index[1:]) * 4)
+
     def exp_end(self):
-        self.semantic_stack.pop()
+        self.use(self.semantic_stack.pop())
         self.last_num = None
         self.last_id = None
         self.last_type = None
 
     def save_break(self):
         self.break_stack.append((self.break_scope[-1], self.program_line))
+        self.mark_source(self.program_line)
         self.program_line += 1
 
     def jp_break(self):
+        self.start_block()
         for i, (scope, line) in enumerate(reversed(self.break_stack)):
             if scope == self.break_scope[-1]:
                 self.codes_generated[line] = (
@@ -310,6 +444,7 @@ class CodeGenerator:
     def scope_enter(self):
         if not self.jumped_to_main:
             self.waiting_function_jumps[self.program_line] = "main"
+            self.source_map[self.program_line] = (self.lexer.lineno, None)
             self.program_line += 1
             self.jumped_to_main = True
         self.last_num = None
@@ -323,11 +458,21 @@ class CodeGenerator:
         self.last_id = None
         self.last_type = None
         self.scope_stack.pop()
+        if len(self.scope_stack) > 1:
+            for address in reversed(self.address_scope_stack[-1]):
+                self.free_temp(address)
         self.address_scope_stack.pop()
 
     def declaring_function(self):
         self.current_function_name = self.last_id
         self.current_function_type = self.last_type
+        self.functions.append(
+            {
+                "name": self.last_id,
+                "start_address": self.temp_pointer,
+                "return_lines": [],
+            }
+        )
 
     def start_declaring_params(self):
         self.declaring_function_params = []
@@ -336,12 +481,14 @@ class CodeGenerator:
         pass
 
     def signature_declared(self):
+        self.start_block()
         self.current_function_name = self.semantic_stack.pop()
         self.scope_stack[-2][self.current_function_name] = {
             "addr": self.program_line,
             "type": self.current_function_type,
             "params": self.declaring_function_params,
         }
+        self.functions[-1]["entry_line"] = self.program_line
         for line, function_name in self.waiting_function_jumps.items():
             if function_name == self.current_function_name:
                 self.store_code_line(("JP", self.program_line, None, None), line)
@@ -365,20 +512,29 @@ class CodeGenerator:
         self.add_var_to_scope(self.last_id, -1, "int")
 
     def push_state(self):
-        self.state_saved = []
+        call_site = {
+            "caller": self.current_function_name,
+            "callee": self.last_id,
+            "saves": [],
+            "restores": [],
+        }
         for address_scope in self.address_scope_stack[1:]:
             for addr in address_scope:
+                call_site["saves"].append((self.program_line, addr))
                 self.push_to_stack(addr)
-                self.state_saved.append(addr)
+        call_site["saves"].append((self.program_line, self.return_address))
         self.push_to_stack(self.return_address)
+        self.state_saved.append(call_site)
+        self.call_sites.append(call_site)
 
     def pop_state(self):
-        self.pop_from_stack(self.return_address)
-        for addr in reversed(self.state_saved):
+        call_site = self.state_saved.pop()
+        for line, addr in reversed(call_site["saves"]):
+            call_site["restores"].append((self.program_line, addr))
             self.pop_from_stack(addr)
-        self.state_saved = []
 
     def push_return_address(self):
+        self.code_address_lines.add(self.program_line)
         self.push_to_stack(f"#{self.program_line + 3}")
 
     def pop_return_address(self):
@@ -386,36 +542,44 @@ class CodeGenerator:
             self.pop_from_stack(self.return_address)
 
     def push_return_value(self):
-        addr = self.semantic_stack.pop()
+        addr = self.use(self.semantic_stack.pop())
         self.push_to_stack(addr)
 
     def pop_return_value(self):
-        addr = self.get_temp()
+        addr = self.get_expression_temp()
+        self.state_saved[-1]["return_value_line"] = self.program_line
         self.pop_from_stack(addr)
         self.semantic_stack.append(addr)
 
     def return_void(self):
+        self.functions[-1]["return_lines"].append(self.program_line)
         self.push_to_stack("#0")
         self.add_code_line(("JP", f"@{self.return_address}", None, None))
 
     def return_int(self):
-        addr = self.semantic_stack.pop()
+        addr = self.use(self.semantic_stack.pop())
+        self.functions[-1]["return_lines"].append(self.program_line)
         self.push_to_stack(addr)
         self.add_code_line(("JP", f"@{self.return_address}", None, None))
 
     def default_return(self):
+        self.functions[-1]["return_lines"].append(self.program_line)
         self.push_to_stack("#0")
         if self.current_function_name != "main":
             self.add_code_line(("JP", f"@{self.return_address}", None, None))
 
     def function_declared(self):
         self.current_function_name = None
+        self.functions[-1]["end_address"] = self.temp_pointer
+        self.functions[-1]["end_line"] = self.program_line
+        self.free_temps = {}
 
     def push_arg(self):
-        arg_addr = self.semantic_stack.pop()
+        arg_addr = self.use(self.semantic_stack.pop())
         self.push_to_stack(arg_addr)
 
     def pop_args(self):
+        self.functions[-1]["param_count"] = len(self.scope_stack[-1])
         for var in reversed(self.scope_stack[-1]):
             self.pop_from_stack(self.scope_stack[-1][var]["addr"])
 
@@ -423,6 +587,30 @@ class CodeGenerator:
         value = self.semantic_stack.pop()
         self.add_code_line(("PRINT", value, None, None))
 
+    def relocate(self, new_lines):
+        for call_site in self.call_sites:
+            for key in ["saves", "restores"]:
+                call_site[key] = [(new_lines[line], addr) for line, addr in call_site[key]]
+            if "return_value_line" in call_site:
+                call_site["return_value_line"] = new_lines[call_site["return_value_line"]]
+        for function in self.functions:
+            for key in ["entry_line", "end_line"]:
+                if key in function:
+                    function[key] = new_lines[function[key]]
+            function["return_lines"] = [new_lines[line] for line in function["return_lines"]]
+        self.array_base_lines = {new_lines[line] for line in self.array_base_lines}
+        self.waiting_function_jumps = {
+            new_lines[line]: name for line, name in self.waiting_function_jumps.items()
+        }
+        for name, symbol in self.scope_stack[0].items():
+            if "params" in symbol and name != "output":
+                symbol["addr"] = new_lines[symbol["addr"]]
+        source_map = {}
+        for line, source in sorted(self.source_map.items()):
+            if line < len(new_lines):
+                source_map[new_lines[line]] = source
+        self.source_map = source_map
+
     def to_code_string(self, path):
         self.codes_generated = dict(sorted(self.codes_generated.items()))
         with open(path, "w") as f:
@@ -435,3 +623,16 @@ class CodeGenerator:
                         output += ", "
                 output = output[:-2] + ")\n"
                 f.write(output)
+
+    def to_source_map(self, path):
+        functions = {"output": 1}
+        for function in self.functions:
+            if "entry_line" in function:
+                functions[function["name"]] = function["entry_line"]
+        instructions = [
+            [line, *self.source_map[line]]
+            for line in sorted(self.source_map)
+            if line in self.codes_generated
+        ]
+        with open(path, "w") as f:
+            json.dump({"instructions": instructions, "functions": functions}, f)
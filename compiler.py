@@ -1,22 +1,119 @@
 ### Arshan Dalili: 98105751
 ### Aryan Ahadinia: 98103878
 
+import argparse
 from pathlib import Path
 
-from anytree import RenderTree
+from lexer import Lexer, StreamingLexer
+from pass_manager import LEVELS, PassManager
+from transition_diagram_parser import Parser, StackParser
 
-from lexer import Lexer
-from transition_diagram_parser import Parser
+PARSERS = {"recursive": Parser, "stack": StackParser}
 
 
-def main():
-    lexer = Lexer(Path("input.txt"))
-    parser = Parser(lexer)
+def get_parser_class(parser_name):
+    if parser_name == "generated":
+        from parser_generator import load_generated_parser
+
+        return load_generated_parser()
+    return PARSERS[parser_name]
+
+
+def compile_program(
+    parser_class,
+    input_path="input.txt",
+    output_dir=".",
+    stream=False,
+    build_tree=True,
+    level=0,
+    passes=(),
+    source_map=False,
+):
+    output_dir = Path(output_dir)
+    lexer = (StreamingLexer if stream else Lexer)(Path(input_path))
+    parser = parser_class(lexer, build_tree)
+    pass_manager = PassManager(parser.code_generator, level, passes)
+    pass_manager.configure()
     parse_tree, errors = parser.parse()
-    parser.code_generator.to_code_string("output.txt")
-    with open("parse_tree.txt", "w") as f:
-        f.write(RenderTree(parse_tree.to_anytree()).by_attr())
+    pass_manager.run()
+    parser.code_generator.to_code_string(output_dir / "output.txt")
+    if source_map:
+        parser.code_generator.to_source_map(output_dir / "source_map.json")
+    if build_tree:
+        with open(output_dir / "parse_tree.txt", "w") as f:
+            parse_tree.render(f)
+    return errors
+
+
+def main(
+    parser_name="recursive",
+    stream=False,
+    build_tree=True,
+    peephole=False,
+    live_saves=False,
+    frames=False,
+    fold_constants=False,
+    reuse_temps=False,
+    reduce_indexing=False,
+    value_numbering=False,
+    dead_code=False,
+    inline=False,
+    level=0,
+    source_map=False,
+):
+    flags = {
+        "peephole": peephole,
+        "live_saves": live_saves,
+        "frames": frames,
+        "fold_constants": fold_constants,
+        "reuse_temps": reuse_temps,
+        "reduce_indexing": reduce_indexing,
+        "value_numbering": value_numbering,
+        "dead_code": dead_code,
+        "inline": inline,
+    }
+    compile_program(
+        get_parser_class(parser_name),
+        stream=stream,
+        build_tree=build_tree,
+        level=level,
+        passes=[name for name, on in flags.items() if on],
+        source_map=source_map,
+    )
 
 
 if __name__ == "__main__":
-    main()
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument(
+        "--parser", choices=[*PARSERS, "generated"], default="recursive"
+    )
+    arg_parser.add_argument("--stream", action="store_true")
+    arg_parser.add_argument("--no-tree", action="store_true")
+    arg_parser.add_argument("--peephole", action="store_true")
+    arg_parser.add_argument("--live-saves", action="store_true")
+    arg_parser.add_argument("--frames", action="store_true")
+    arg_parser.add_argument("--fold-constants", action="store_true")
+    arg_parser.add_argument("--reuse-temps", action="store_true")
+    arg_parser.add_argument("--reduce-indexing", action="store_true")
+    arg_parser.add_argument("--value-numbering", action="store_true")
+    arg_parser.add_argument("--dead-code", action="store_true")
+    arg_parser.add_argument("--inline", action="store_true")
+    arg_parser.add_argument("-O", dest="level", type=int, choices=LEVELS, default=0)
+    arg_parser.add_argument("--source-map", action="store_true")
+    args = arg_parser.parse_args()
+    main(
+        args.parser,
+        args.stream,
+        not args.no_tree,
+        args.peephole,
+        args.live_saves,
+        args.frames,
+        args.fold_constants,
+        args.reuse_temps,
+        args.reduce_indexing,
+        args.value_numbering,
+        args.dead_code,
+        args.inline,
+        args.level,
+        args.source_map,
+    )
@@ -0,0 +1,53 @@
+from ir import ControlFlowGraph
+
+BUILTIN_LINES = range(0, 9)
+
+
+class DeadCodeEliminator(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+
+    def optimize(self):
+        graph = ControlFlowGraph(self.code_generator)
+        if not graph.build():
+            return 0, []
+        reachable = set(BUILTIN_LINES)
+        for block in graph.reachable([0]):
+            reachable.update(instruction.line for instruction in block.instructions)
+        removed = 0
+        for block in graph.blocks:
+            kept = [i for i in block.instructions if i.line in reachable]
+            removed += len(block.instructions) - len(kept)
+            block.instructions = kept
+        dropped = self.drop_metadata(reachable)
+        graph.lower()
+        return removed, dropped
+
+    def drop_metadata(self, reachable):
+        code_generator = self.code_generator
+        dropped = [
+            function["name"]
+            for function in code_generator.functions
+            if function.get("entry_line") not in reachable
+        ]
+        code_generator.functions = [
+            function
+            for function in code_generator.functions
+            if function["name"] not in dropped
+        ]
+        for function in code_generator.functions:
+            function["return_lines"] = [
+                line for line in function["return_lines"] if line in reachable
+            ]
+        code_generator.call_sites = [
+            call_site
+            for call_site in code_generator.call_sites
+            if call_site["saves"][0][0] in reachable
+        ]
+        code_generator.array_base_lines = code_generator.array_base_lines & reachable
+        code_generator.waiting_function_jumps = {
+            line: name
+            for line, name in code_generator.waiting_function_jumps.items()
+            if line in reachable
+        }
+        return dropped
@@ -0,0 +1,127 @@
+from peephole import compact_codes, dense_codes, get_int
+
+
+class FrameAllocator(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.stack_pointer = code_generator.stack_pointer
+        self.frame_pointer = code_generator.frame_pointer
+        self.return_address = code_generator.return_address
+        self.return_value = code_generator.return_value
+        self.codes = []
+        self.frames = []
+
+    def optimize(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return []
+        self.codes = codes
+        self.frames = [
+            function
+            for function in self.code_generator.functions
+            if function["name"] != "main" and "end_line" in function
+        ]
+        original = list(self.codes)
+        for function in self.frames:
+            for line in range(function["entry_line"], function["end_line"]):
+                code = self.codes[line]
+                if line in self.code_generator.array_base_lines:
+                    code = self.lower_array_base(code, function)
+                self.codes[line] = self.rewrite(code, function)
+            self.lower_entry(function)
+            for line in function["return_lines"]:
+                self.codes[line] = [
+                    ("ASSIGN", self.frame_pointer, self.stack_pointer, None)
+                ] + self.codes[line]
+        for call_site in self.code_generator.call_sites:
+            self.lower_call(call_site, original)
+
+        self.codes, _ = compact_codes(self.code_generator, self.codes)
+        return [
+            (function["name"], function["end_address"] - function["start_address"])
+            for function in self.frames
+        ]
+
+    def offset(self, address, function):
+        if address is None:
+            return None
+        if not function["start_address"] <= address < function["end_address"]:
+            return None
+        return address - function["start_address"]
+
+    def rewrite(self, code, function):
+        scratch = iter(self.code_generator.scratch)
+        cells = {}
+        prefix = []
+        operands = list(code)
+        for i, operand in enumerate(operands[1:], 1):
+            if (code[0] == "JP" and i == 1) or (code[0] == "JPF" and i == 2):
+                continue
+            if isinstance(operand, str) and operand.startswith("@"):
+                offset = self.offset(get_int(operand[1:]), function)
+                if offset is None:
+                    continue
+                cell = next(scratch)
+                prefix.append(("ADD", self.frame_pointer, f"#{offset}", cell))
+                prefix.append(("ASSIGN", f"@{cell}", cell, None))
+                operands[i] = f"@{cell}"
+            elif isinstance(operand, str) and operand.startswith("#"):
+                continue
+            else:
+                offset = self.offset(get_int(operand), function)
+                if offset is None:
+                    continue
+                if offset not in cells:
+                    cells[offset] = next(scratch)
+                    prefix.append(("ADD", self.frame_pointer, f"#{offset}", cells[offset]))
+                operands[i] = f"@{cells[offset]}"
+        return prefix + [tuple(operands)]
+
+    def lower_array_base(self, code, function):
+        offset = self.offset(code[2], function) + 4
+        return ("ADD", self.frame_pointer, f"#{offset}", code[2])
+
+    def lower_entry(self, function):
+        entry = function["entry_line"]
+        params = function["param_count"]
+        for line in range(entry + 2, entry + 2 + 2 * params):
+            self.codes[line] = None
+        self.codes[entry + 1] = self.codes[entry + 1] + [
+            ("SUB", self.stack_pointer, f"#{4 * params}", self.frame_pointer),
+            (
+                "ADD",
+                self.frame_pointer,
+                f"#{function['end_address'] - function['start_address']}",
+                self.stack_pointer,
+            ),
+        ]
+
+    def lower_call(self, call_site, original):
+        # framed callers keep only the frame pointer and return address
+        # across a call; the builtin output leaves the frame pointer alone.
+        saves, restores = call_site["saves"], call_site["restores"]
+        if not restores:
+            return
+        function = next(
+            (f for f in self.frames if f["name"] == call_site["caller"]), None
+        )
+        for line, addr in saves[:-1]:
+            self.codes[line] = self.codes[line + 1] = None
+        for line, addr in restores[1:]:
+            self.codes[line] = self.codes[line + 1] = None
+        if function is None or call_site["callee"] == "output":
+            return
+        save, restore = saves[-1][0], restores[0][0]
+        self.codes[save] = [
+            ("ASSIGN", self.frame_pointer, f"@{self.stack_pointer}", None),
+            ("ADD", "#4", self.stack_pointer, self.stack_pointer),
+        ] + self.codes[save]
+        self.codes[restore + 1] = self.codes[restore + 1] + [
+            ("SUB", self.stack_pointer, "#4", self.stack_pointer),
+            ("ASSIGN", f"@{self.stack_pointer}", self.frame_pointer, None),
+        ]
+        value = call_site["return_value_line"] + 1
+        self.codes[value] = [("ASSIGN", original[value][1], self.return_value, None)]
+        self.codes[restore + 1] += self.rewrite(
+            ("ASSIGN", self.return_value, original[value][2], None), function
+        )
@@ -0,0 +1,141 @@
+from ir import BasicBlock, ControlFlowGraph, Instruction, Label
+from peephole import dense_codes
+
+INLINE_LIMIT = 16
+
+
+class Inliner(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.stack_pointer = code_generator.stack_pointer
+        self.return_address = code_generator.return_address
+        self.graph = ControlFlowGraph(code_generator)
+        self.codes = []
+        self.removed = set()
+        self.count = 0
+
+    def optimize(self):
+        if not self.graph.build():
+            return []
+        self.codes = dense_codes(self.code_generator)
+        functions = {
+            function["name"]: function
+            for function in self.code_generator.functions
+            if "end_line" in function and "param_count" in function
+        }
+        report = []
+        for call_site in list(self.code_generator.call_sites):
+            function = functions.get(call_site["callee"])
+            if function is None or "return_value_line" not in call_site:
+                continue
+            if call_site["caller"] == call_site["callee"]:
+                if self.eliminate_tail_call(call_site, function):
+                    report.append(("tail", call_site["caller"], call_site["callee"]))
+            elif self.is_leaf(function) and self.is_small(function):
+                self.inline(call_site, function)
+                report.append(("inline", call_site["caller"], call_site["callee"]))
+        if not report:
+            return report
+        for block in self.graph.blocks:
+            block.instructions = [
+                instruction
+                for instruction in block.instructions
+                if instruction.line not in self.removed
+            ]
+        self.graph.lower()
+        return report
+
+    def is_leaf(self, function):
+        return not any(
+            function["entry_line"] <= line < function["end_line"]
+            for line in self.code_generator.code_address_lines
+        )
+
+    def is_small(self, function):
+        return function["end_line"] - function["entry_line"] <= INLINE_LIMIT
+
+    def block_of(self, line):
+        for block in self.graph.blocks:
+            if any(instruction.line == line for instruction in block.instructions):
+                return block
+        return None
+
+    def push(self, value):
+        return ("ASSIGN", value, f"@{self.stack_pointer}", None)
+
+    def call_lines(self, call_site):
+        call = call_site["return_value_line"] - 3
+        if call not in self.code_generator.code_address_lines:
+            return None
+        return call
+
+    def remove_call(self, call_site, call):
+        for line, addr in call_site["saves"] + call_site["restores"]:
+            self.removed.update([line, line + 1])
+        self.removed.update([call, call + 1, call + 2])
+        self.code_generator.call_sites.remove(call_site)
+
+    def eliminate_tail_call(self, call_site, function):
+        call = self.call_lines(call_site)
+        if call is None:
+            return False
+        value = call_site["return_value_line"]
+        result = self.codes[value + 1][2]
+        line = value + 2 + 2 * len(call_site["restores"])
+        if (
+            line not in function["return_lines"]
+            or self.codes[line] != self.push(result)
+            or self.codes[line + 2] != ("JP", f"@{self.return_address}", None, None)
+        ):
+            return False
+        entry = function["entry_line"] + 2
+        body = entry + 2 * function["param_count"]
+        block = self.block_of(call + 2)
+        self.remove_call(call_site, call)
+        self.removed.update(range(value, line + 3))
+        function["return_lines"].remove(line)
+        source_map = self.code_generator.source_map
+        block.instructions += [
+            Instruction(self.codes[i][0], self.codes[i][1:], source=source_map.get(i))
+            for i in range(entry, body)
+        ]
+        block.instructions.append(
+            Instruction(
+                "JP",
+                [self.graph.split(body), None, None],
+                source=source_map.get(call + 2),
+            )
+        )
+        return True
+
+    def inline(self, call_site, function):
+        call = self.call_lines(call_site)
+        if call is None:
+            return
+        self.count += 1
+        block = self.block_of(call + 2)
+        continuation = self.graph.labels[call_site["return_value_line"]]
+        self.remove_call(call_site, call)
+        clones = {}
+        blocks = []
+        for callee_block in self.graph.blocks:
+            lines = [instruction.line for instruction in callee_block.instructions]
+            if not lines or lines[0] is None:
+                continue
+            if function["entry_line"] <= lines[0] < function["end_line"]:
+                label = Label(f"{callee_block.label.name}.{self.count}")
+                clones[callee_block.label] = BasicBlock(label)
+                blocks.append(callee_block)
+        for callee_block in blocks:
+            clone = clones[callee_block.label]
+            for instruction in callee_block.instructions:
+                if instruction.line < function["entry_line"] + 2:
+                    continue
+                operands = [clones[o].label if o in clones else o for o in instruction.operands]
+                if instruction.op == "JP" and operands[0] == f"@{self.return_address}":
+                    operands[0] = continuation
+                clone.instructions.append(
+                    Instruction(instruction.op, operands, source=instruction.source)
+                )
+        index = self.graph.blocks.index(block)
+        self.graph.blocks[index + 1 : index + 1] = [clones[b.label] for b in blocks]
@@ -0,0 +1,190 @@
+from peephole import dense_codes, get_int, install_codes
+
+
+class Label(object):
+    def __init__(self, name):
+        self.name = name
+        self.block = None
+
+    def __repr__(self):
+        return self.name
+
+
+class Instruction(object):
+    def __init__(self, op, operands, line=None, code_address=False, source=None):
+        self.op = op
+        self.operands = list(operands)
+        self.line = line
+        self.code_address = code_address
+        self.source = source
+
+    def target(self):
+        if self.op == "JP" and isinstance(self.operands[0], Label):
+            return self.operands[0]
+        if self.op == "JPF" and isinstance(self.operands[1], Label):
+            return self.operands[1]
+        if self.code_address:
+            return self.operands[0]
+        return None
+
+    def lower(self):
+        operands = []
+        for operand in self.operands:
+            if isinstance(operand, Label):
+                line = operand.block.line
+                operand = f"#{line}" if self.code_address else line
+            operands.append(operand)
+        return (self.op, *operands)
+
+    def __repr__(self):
+        operands = ", ".join("" if o is None else str(o) for o in self.operands)
+        return f"{self.op} {operands}"
+
+
+class BasicBlock(object):
+    def __init__(self, label):
+        self.label = label
+        self.label.block = self
+        self.instructions = []
+        self.successors = []
+        self.predecessors = []
+        self.line = None
+
+    def terminator(self):
+        return self.instructions[-1] if self.instructions else None
+
+
+class ControlFlowGraph(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.blocks = []
+        self.labels = {}
+        self.size = 0
+
+    def build(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return False
+        self.size = len(codes)
+        code_address_lines = self.code_generator.code_address_lines
+        source_map = self.code_generator.source_map
+        call_lines = {line + 2 for line in code_address_lines}
+        names = {
+            function["entry_line"]: function["name"]
+            for function in self.code_generator.functions
+            if "entry_line" in function
+        }
+        names[1] = "output"
+
+        leaders = {0, len(codes)}
+        for line, code in enumerate(codes):
+            if code[0] == "JP":
+                leaders.add(line + 1)
+                if get_int(code[1]) is not None:
+                    leaders.add(get_int(code[1]))
+            elif code[0] == "JPF":
+                leaders.update([line + 1, get_int(code[2])])
+            elif line in code_address_lines:
+                leaders.add(int(code[1][1:]))
+        for line in sorted(leaders):
+            self.labels[line] = Label(names.get(line, f"L{line}"))
+            self.blocks.append(BasicBlock(self.labels[line]))
+
+        block = None
+        for line, code in enumerate(codes):
+            if line in self.labels:
+                block = self.labels[line].block
+            operands = list(code[1:])
+            if code[0] == "JP" and get_int(code[1]) is not None:
+                operands[0] = self.labels[get_int(code[1])]
+            elif code[0] == "JPF":
+                operands[1] = self.labels[get_int(code[2])]
+            elif line in code_address_lines:
+                operands[0] = self.labels[int(code[1][1:])]
+            block.instructions.append(
+                Instruction(
+                    code[0],
+                    operands,
+                    line,
+                    line in code_address_lines,
+                    source_map.get(line),
+                )
+            )
+
+        for index, block in enumerate(self.blocks):
+            following = self.blocks[index + 1] if index + 1 < len(self.blocks) else None
+            terminator = block.terminator()
+            successors = []
+            if terminator is None or terminator.op not in ["JP", "JPF"]:
+                successors = [following]
+            elif terminator.op == "JPF":
+                successors = [following, terminator.target().block]
+            elif terminator.target() is not None:
+                successors = [terminator.target().block]
+                if terminator.line in call_lines:
+                    successors.append(following)
+            for successor in successors:
+                if successor is not None and successor not in block.successors:
+                    block.successors.append(successor)
+                    successor.predecessors.append(block)
+        return True
+
+    def split(self, line):
+        for index, block in enumerate(self.blocks):
+            lines = [instruction.line for instruction in block.instructions]
+            if line not in lines:
+                continue
+            position = lines.index(line)
+            if position == 0:
+                return block.label
+            self.labels[line] = Label(f"L{line}")
+            following = BasicBlock(self.labels[line])
+            following.instructions = block.instructions[position:]
+            block.instructions = block.instructions[:position]
+            following.successors = block.successors
+            for successor in following.successors:
+                successor.predecessors.remove(block)
+                successor.predecessors.append(following)
+            block.successors = [following]
+            following.predecessors = [block]
+            self.blocks.insert(index + 1, following)
+            return following.label
+        return None
+
+    def reachable(self, roots):
+        reachable = set()
+        work = [self.labels[line].block for line in roots if line in self.labels]
+        while work:
+            block = work.pop()
+            if block not in reachable:
+                reachable.add(block)
+                work.extend(block.successors)
+        return [block for block in self.blocks if block in reachable]
+
+    def lower(self):
+        codes = []
+        code_address_lines = set()
+        source_map = {}
+        new_lines = [None] * (self.size + 1)
+        for block in self.blocks:
+            block.line = len(codes)
+            for instruction in block.instructions:
+                if instruction.line is not None:
+                    new_lines[instruction.line] = len(codes)
+                if instruction.code_address:
+                    code_address_lines.add(len(codes))
+                if instruction.source is not None:
+                    source_map[len(codes)] = instruction.source
+                codes.append(instruction)
+        new_lines[self.size] = len(codes)
+        for line in reversed(range(self.size)):
+            if new_lines[line] is None:
+                new_lines[line] = new_lines[line + 1]
+
+        install_codes(
+            self.code_generator, [instruction.lower() for instruction in codes]
+        )
+        self.code_generator.code_address_lines = code_address_lines
+        self.code_generator.relocate(new_lines)
+        self.code_generator.source_map = source_map
+        return new_lines
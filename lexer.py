@@ -1,11 +1,30 @@
+import re
+import sys
 from enum import Enum
 from typing import NamedTuple
 
 KEYWORDS = sorted(["if", "else", "void", "int", "repeat", "break", "until", "return"])
+KEYWORD_SET = frozenset(KEYWORDS)
 SYMBOLS = [";", ":", ",", "[", "]", "(", ")", "{", "}", "+", "-", "*", "=", "<", "=="]
-is_invalid_char = (
-    lambda x: x not in SYMBOLS and not x.isalnum() and not x.isspace() and x != "/"
+SYMBOL_CHARS = r";:,\[\](){}+\-*=<"
+INVALID_CHAR = rf"(?:_|[^\w\s{SYMBOL_CHARS}/])"
+TOKEN_PATTERN = re.compile(
+    rf"(?P<NUM>\d+)(?P<INVALID_NUMBER>[^\W\d_])?"
+    rf"|(?P<ID>[^\W\d_]\w*)(?P<INVALID_ID>[^\w\s{SYMBOL_CHARS}])?"
+    rf"|(?P<COMMENT>/\*.[^*]*(?:\*[^/][^*]*)*\*/)"
+    rf"|(?P<UNCLOSED_COMMENT>/\*.*)"
+    rf"|(?P<SLASH>/){INVALID_CHAR}?"
+    rf"|(?P<UNMATCHED_COMMENT>\*/)"
+    rf"|(?P<INVALID_SYMBOL>[=*]){INVALID_CHAR}"
+    rf"|(?P<SYMBOL>==|[{SYMBOL_CHARS}])"
+    rf"|(?P<INVALID_INPUT>.)",
+    re.DOTALL,
 )
+UNNAMED_TOKEN_PATTERN = re.sub(r"\(\?P<\w+>", "(?:", TOKEN_PATTERN.pattern)
+LEXEME_PATTERN = re.compile(rf"\s*(?:{UNNAMED_TOKEN_PATTERN})|\s+", re.DOTALL)
+CHUNK_SIZE = 1 << 16
+MAX_CACHED_LEXEME = 64
+MAX_CACHE_SIZE = 1 << 16
 
 
 def write_output(tokens, errors, symbol_table):
@@ -47,9 +66,23 @@ class ErrorType(Enum):
     NO_ERROR_MESSAGE = "There is no lexical error."
 
 
+TOKEN_TYPES = {"NUM": TokenType.NUM, "SYMBOL": TokenType.SYMBOL}
+ERROR_TYPES = {
+    "INVALID_NUMBER": ErrorType.INVALID_NUMBER,
+    "INVALID_ID": ErrorType.INVALID_INPUT,
+    "UNCLOSED_COMMENT": ErrorType.UNCLOSED_COMMENT,
+    "SLASH": ErrorType.INVALID_INPUT,
+    "UNMATCHED_COMMENT": ErrorType.UNMATCHED_COMMENT,
+    "INVALID_SYMBOL": ErrorType.INVALID_INPUT,
+    "INVALID_INPUT": ErrorType.INVALID_INPUT,
+}
+
+
 class Token(NamedTuple):
     type: TokenType
     value: str
+    line: int = 0
+    column: int = 0
 
     def __str__(self) -> str:
         return f"({self.type.value}, {self.value})"
@@ -58,6 +91,8 @@ class Token(NamedTuple):
 class Error(NamedTuple):
     type: ErrorType
     value: str
+    line: int = 0
+    column: int = 0
 
     def __str__(self) -> str:
         if self.type == ErrorType.UNCLOSED_COMMENT:
@@ -66,156 +101,161 @@ class Error(NamedTuple):
             return f"({self.value}, {self.type.value})"
 
 
+def find_comment_end(text, position):
+    while True:
+        position = text.find("*", position)
+        if position == -1:
+            return None, len(text)
+        if position + 1 == len(text):
+            return None, position
+        if text[position + 1] == "/":
+            return position + 2, None
+        position += 2
+
+
+def movement(text):
+    newlines = text.count("\n")
+    if newlines:
+        return newlines, len(text) - text.rfind("\n") - 1
+    return 0, len(text)
+
+
+def classify(lexeme):
+    value = lexeme.lstrip()
+    kind = TOKEN_PATTERN.match(value).lastgroup if value else None
+    if kind is None or kind == "COMMENT":
+        return (None, None, None, *movement(lexeme), 0, 0)
+    if kind == "ID":
+        if value in KEYWORD_SET:
+            token_class, token_type = Token, TokenType.KEYWORD
+        else:
+            token_class, token_type, value = Token, TokenType.ID, sys.intern(value)
+    elif kind in TOKEN_TYPES:
+        token_class, token_type = Token, TOKEN_TYPES[kind]
+    else:
+        token_class, token_type = Error, ERROR_TYPES[kind]
+    prefix = lexeme[: len(lexeme) - len(value)]
+    return (token_class, token_type, value, *movement(prefix), *movement(value))
+
+
 class Lexer:
     def __init__(self, input_path):
-        self.pos = 0
-        self.text = None
-        self.current_char = None
-        self.next_char = None
         self.lineno = 1
-        self.is_comment = False
-        self.pos = 0
+        self.column = 1
+        self.current_token = None
         with open(input_path, "r") as f:
             self.text = f.read()
-        self.current_char = self.text[self.pos]
+        self.lexemes = self.scan()
+        self.token_cache = {}
+
+    def scan(self):
+        text = self.text
+        length = len(text)
+        pos = 0
+        while pos < length:
+            end = text.find("\n", pos + CHUNK_SIZE) + 1 or length
+            lexemes = LEXEME_PATTERN.findall(text, pos, end)
+            comment = lexemes[-1].lstrip()
+            if end < length and comment.startswith("/*"):
+                lexemes[-1] = lexemes[-1][: -len(comment)]
+                start = end - len(comment)
+                yield from lexemes
+                end, _ = find_comment_end(text, start + 3)
+                if end is None:
+                    yield text[start:]
+                    return
+                yield text[start:end]
+            else:
+                yield from lexemes
+            pos = end
 
     def get_next_token(self):
-        while True:
-            if self.current_char is None:
-                self.current_token = Token(TokenType.EOF, "$")
-                return self.current_token
-            while self.is_newline(self.current_char):
-                self.lineno += 1
-                self.advance()
-            next_token = self._get_next_token()
-            if next_token is None:
-                continue
-            elif next_token.type == TokenType.COMMENT:
+        token_cache = self.token_cache
+        for lexeme in self.lexemes:
+            entry = token_cache.get(lexeme)
+            if entry is None:
+                entry = classify(lexeme)
+                if len(lexeme) <= MAX_CACHED_LEXEME:
+                    if len(token_cache) >= MAX_CACHE_SIZE:
+                        token_cache.clear()
+                    token_cache[lexeme] = entry
+            (
+                token_class,
+                token_type,
+                value,
+                newlines,
+                tail,
+                value_newlines,
+                value_tail,
+            ) = entry
+            if newlines:
+                self.lineno += newlines
+                self.column = tail + 1
+            else:
+                self.column += tail
+            if token_class is None:
                 continue
-            break
-        self.current_token = next_token
-        return next_token
+            token = token_class(token_type, value, self.lineno, self.column)
+            newlines, tail = value_newlines, value_tail
+            if newlines:
+                self.lineno += newlines
+                self.column = tail + 1
+            else:
+                self.column += tail
+            self.current_token = token
+            return token
+        self.current_token = Token(TokenType.EOF, "$", self.lineno, self.column)
+        return self.current_token
 
     def get_current_token(self):
         return self.current_token
 
-    def advance(self):
-        self.pos += 1
-        if self.pos > len(self.text) - 1:
-            self.current_char = None
-        else:
-            self.current_char = self.text[self.pos]
+    def tokens(self):
+        while True:
+            token = self.get_next_token()
+            yield token
+            if token.type == TokenType.EOF:
+                return
 
-    def is_newline(self, char):
-        return char == "\n"
 
-    def skip_whitespace(self):
-        while self.current_char is not None and self.current_char.isspace():
-            if not self.is_newline(self.current_char):
-                self.advance()
-            else:
-                return True
-        return False
-
-    def number_handler(self):
-        result = ""
-        while self.current_char is not None:
-            if self.current_char.isdigit():
-                result += self.current_char
-                self.advance()
-            elif self.current_char.isalpha():
-                result += self.current_char
-                self.advance()
-                return Error(ErrorType.INVALID_NUMBER, result)
-            else:
-                break
-        return Token(TokenType.NUM, result)
-
-    def _get_next_token(self):
-        result = ""
-        while self.current_char is not None:
-            # WHITESPACE Handler
-            if self.current_char.isspace():
-                new_line = self.skip_whitespace()
-                if new_line:
-                    return None
-                continue
+class StreamingLexer(Lexer):
+    def __init__(self, input_path, chunk_size=CHUNK_SIZE):
+        self.lineno = 1
+        self.column = 1
+        self.current_token = None
+        self.input_path = input_path
+        self.chunk_size = chunk_size
+        self.lexemes = self.scan()
+        self.token_cache = {}
 
-            # NUM Handler
-            elif self.current_char.isdigit():
-                return self.number_handler()
-
-            # ID and KEYWORD Handler
-            elif self.current_char.isalpha():
-                while self.current_char is not None:
-                    if self.current_char.isalnum() or (self.current_char == '_' and len(result) > 0):
-                        result += self.current_char
-                        self.advance()
-                    elif self.current_char.isspace() or self.current_char in SYMBOLS:
-                        break
-                    else:
-                        result += self.current_char
-                        self.advance()
-                        return Error(ErrorType.INVALID_INPUT, result)
-                if result in KEYWORDS:
-                    return Token(TokenType.KEYWORD, result)
-                else:
-                    return Token(TokenType.ID, result)
-
-            # COMMENT HANDLER
-            elif self.current_char == "/":
-                result += self.current_char
-                self.advance()
-                if self.current_char == "*":
-                    # COMMENT START
-                    self.is_comment = True
-                    result += self.current_char
-                    self.advance()
-                    while self.current_char is not None:
-                        result += self.current_char
-                        self.advance()
-                        if self.current_char == "*":
-                            result += self.current_char
-                            self.advance()
-                            if self.current_char == "/":
-                                # COMMENT END
-                                result += self.current_char
-                                self.is_comment = False
-                                self.advance()
-                                return Token(TokenType.COMMENT, result)
-                    if self.current_char is None and self.is_comment:
-                        return Error(ErrorType.UNCLOSED_COMMENT, result)
-                else:
-                    if is_invalid_char(self.current_char):
-                        result += self.current_char
-                        self.advance()
-                    return Error(ErrorType.INVALID_INPUT, result)
-
-            # SYMBOL Handler
-            elif self.current_char in SYMBOLS:
-                result += self.current_char
-                self.advance()
-                if result == "=":
-                    if self.current_char == "=":
-                        result += self.current_char
-                        self.advance()
-                    elif is_invalid_char(self.current_char):
-                        result += self.current_char
-                        self.advance()
-                        return Error(ErrorType.INVALID_INPUT, result)
-                elif result == "*":
-                    if self.current_char == "/":
-                        result += self.current_char
-                        self.advance()
-                        if not self.is_comment:
-                            return Error(ErrorType.UNMATCHED_COMMENT, result)
-                    elif is_invalid_char(self.current_char):
-                        result += self.current_char
-                        self.advance()
-                        return Error(ErrorType.INVALID_INPUT, result)
-
-                return Token(TokenType.SYMBOL, result)
-            else:
-                result += self.current_char
-                self.advance()
-                return Error(ErrorType.INVALID_INPUT, result)
+    def scan(self):
+        with open(self.input_path, "r") as f:
+            buffer = ""
+            while True:
+                chunk = f.read(self.chunk_size)
+                buffer += chunk
+                lexemes = LEXEME_PATTERN.findall(buffer)
+                if not chunk:
+                    yield from lexemes
+                    return
+                if not lexemes:
+                    continue
+                last = lexemes.pop()
+                yield from lexemes
+                comment = last.lstrip()
+                if not comment.startswith("/*"):
+                    buffer = last
+                    continue
+                if len(comment) < len(last):
+                    yield last[: -len(comment)]
+                buffer = comment
+                end, position = find_comment_end(buffer, 3)
+                while end is None:
+                    chunk = f.read(self.chunk_size)
+                    if not chunk:
+                        yield buffer
+                        return
+                    buffer += chunk
+                    end, position = find_comment_end(buffer, max(position, 3))
+                yield buffer[:end]
+                buffer = buffer[end:]
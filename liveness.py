@@ -0,0 +1,108 @@
+from peephole import ARITHMETIC_OPS, compact_codes, dense_codes, get_int
+
+
+def uses_and_defs(code):
+    uses, defs = set(), set()
+    if code[0] in ARITHMETIC_OPS:
+        sources, target = code[1:3], code[3]
+    elif code[0] == "ASSIGN":
+        sources, target = code[1:2], code[2]
+    elif code[0] == "JPF":
+        sources, target = code[1:2], None
+    elif code[0] in ["JP", "PRINT"]:
+        sources, target = code[1:2], None
+        if code[0] == "JP" and get_int(code[1]) is not None:
+            sources = []
+    else:
+        sources, target = [], None
+    for operand in sources:
+        if isinstance(operand, str) and operand.startswith("@"):
+            uses.add(get_int(operand[1:]))
+        elif get_int(operand) is not None:
+            uses.add(get_int(operand))
+    if isinstance(target, str) and target.startswith("@"):
+        uses.add(get_int(target[1:]))
+    elif get_int(target) is not None:
+        defs.add(get_int(target))
+    return uses, defs
+
+
+def live_in(codes, successors, ignored_lines=()):
+    count = len(codes)
+    effects = [
+        (set(), set()) if line in ignored_lines else uses_and_defs(code)
+        for line, code in enumerate(codes)
+    ]
+    successors = [successors(line) for line in range(count)]
+    predecessors = [[] for _ in range(count + 1)]
+    for line in range(count):
+        for successor in successors[line]:
+            predecessors[min(successor, count)].append(line)
+    live = [set() for _ in range(count + 1)]
+    work = list(range(count))
+    pending = set(work)
+    while work:
+        line = work.pop()
+        pending.discard(line)
+        uses, defs = effects[line]
+        live_out = set()
+        for successor in successors[line]:
+            live_out |= live[min(successor, count)]
+        live_line = uses | (live_out - defs)
+        if live_line != live[line]:
+            live[line] = live_line
+            for predecessor in predecessors[line]:
+                if predecessor not in pending:
+                    pending.add(predecessor)
+                    work.append(predecessor)
+    return live
+
+
+class StateSaveEliminator(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.codes = []
+        self.call_lines = set()
+        self.state_lines = set()
+
+    def optimize(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return []
+        self.codes = codes
+        self.call_lines = {
+            line + 2 for line in self.code_generator.code_address_lines
+        }
+        self.state_lines = set()
+        for call_site in self.code_generator.call_sites:
+            for line, addr in call_site["saves"] + call_site["restores"]:
+                self.state_lines.update([line, line + 1])
+        live = live_in(self.codes, self.successors, self.state_lines)
+
+        report = []
+        for call_site in self.code_generator.call_sites:
+            saves, restores = call_site["saves"], call_site["restores"]
+            if not restores:
+                continue
+            live_after = live[restores[0][0]]
+            eliminated = 0
+            for (save, addr), (restore, _) in zip(saves, reversed(restores)):
+                if addr not in live_after:
+                    self.codes[save : save + 2] = [None, None]
+                    self.codes[restore : restore + 2] = [None, None]
+                    eliminated += 1
+            report.append((saves[0][0], call_site["callee"], len(saves), eliminated))
+
+        self.codes, _ = compact_codes(self.code_generator, self.codes)
+        return report
+
+    def successors(self, line):
+        code = self.codes[line]
+        if line in self.call_lines:
+            return [line + 1]
+        if code[0] == "JP":
+            target = get_int(code[1])
+            return [] if target is None else [target]
+        if code[0] == "JPF":
+            return [line + 1, get_int(code[2])]
+        return [line + 1]
@@ -0,0 +1,171 @@
+from liveness import uses_and_defs
+from peephole import ARITHMETIC_OPS, compact_codes, dense_codes, get_int, install_codes
+
+
+class LoopStrengthReducer(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.codes = []
+        self.targets = set()
+
+    def optimize(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return []
+        self.codes = codes
+        report = []
+        line = 0
+        while line < len(self.codes):
+            code = self.codes[line]
+            head = get_int(code[2]) if code[0] == "JPF" else None
+            if head is not None and head <= line:
+                reduced = self.reduce(head, line)
+                if reduced:
+                    new_lines = self.compact(head, line, reduced)
+                    report = [[new_lines[h], n] for h, n in report]
+                    report.append([new_lines[head], len(reduced[1])])
+                    line = new_lines[line]
+            line += 1
+        install_codes(self.code_generator, self.codes)
+        return [tuple(entry) for entry in report]
+
+    def jumps(self):
+        for line, code in enumerate(self.codes):
+            if code[0] == "JP" and get_int(code[1]) is not None:
+                yield line, get_int(code[1])
+            elif code[0] == "JPF" and get_int(code[2]) is not None:
+                yield line, get_int(code[2])
+        for line in self.code_generator.code_address_lines:
+            yield line, int(self.codes[line][1][1:])
+
+    def is_variable(self, operand):
+        address = get_int(operand)
+        return (
+            address is not None
+            and address >= self.code_generator.temp_start
+            and address not in self.code_generator.expression_temps
+            and not self.code_generator.is_element(address)
+        )
+
+    def definitions(self, head, end):
+        definitions = {}
+        for line in range(head, end + 1):
+            code = self.codes[line]
+            if code[0] == "ASSIGN":
+                target = code[2]
+            elif code[0] in ARITHMETIC_OPS:
+                target = code[3]
+            else:
+                continue
+            if get_int(target) is not None:
+                definitions.setdefault(get_int(target), []).append(line)
+        return definitions
+
+    def step(self, line, head, variable):
+        code = self.codes[line]
+        if line <= head or line in self.targets or code[0] != "ASSIGN":
+            return None
+        update = self.codes[line - 1]
+        if update[3] != code[1]:
+            return None
+        if update[0] == "ADD" and get_int(update[1]) == variable:
+            increment = update[2]
+        elif update[0] == "ADD" and get_int(update[2]) == variable:
+            increment = update[1]
+        elif update[0] == "SUB" and get_int(update[1]) == variable:
+            increment = update[2]
+        else:
+            return None
+        if not (isinstance(increment, str) and increment.startswith("#")):
+            return None
+        if not increment[1:].lstrip("-").isdigit():
+            return None
+        return int(increment[1:]) * (-1 if update[0] == "SUB" else 1)
+
+    def is_consumed(self, line, address):
+        if get_int(self.codes[line][3]) == address:
+            return True
+        for current in range(line + 1, len(self.codes)):
+            if current in self.targets:
+                return True
+            code = self.codes[current]
+            uses, defs = uses_and_defs(code)
+            if address in uses:
+                return False
+            if address in defs or code[0] in ["JP", "JPF"]:
+                return True
+        return True
+
+    def reduce(self, head, end):
+        self.targets = set()
+        for line, target in self.jumps():
+            if head < target <= end and not head <= line <= end:
+                return None
+            self.targets.add(target)
+        body = range(head, end + 1)
+        if any(line in self.code_generator.code_address_lines for line in body):
+            return None
+        definitions = self.definitions(head, end)
+        steps = {
+            line: self.step(line, head, variable)
+            for variable, lines in definitions.items()
+            for line in lines
+        }
+
+        pointers = {}
+        for line in range(head, end):
+            code, next_code = self.codes[line], self.codes[line + 1]
+            if not (
+                code[0] == "MULT"
+                and code[2] == "#4"
+                and next_code[0] == "ADD"
+                and next_code[2] == code[3]
+                and self.is_consumed(line + 1, get_int(code[3]))
+                and line + 1 not in self.targets
+                and self.is_variable(code[1])
+                and get_int(next_code[1]) is not None
+                and get_int(next_code[1]) not in definitions
+            ):
+                continue
+            variable = get_int(code[1])
+            if any(steps[d] is None for d in definitions.get(variable, [])):
+                continue
+            key = (variable, get_int(next_code[1]))
+            pointers.setdefault(key, []).append(line)
+
+        pointers = {
+            key: sites
+            for key, sites in pointers.items()
+            if len(sites) >= len(definitions.get(key[0], []))
+        }
+        if not pointers:
+            return None
+        preheader = []
+        sites = []
+        for (variable, base), lines in pointers.items():
+            pointer = self.code_generator.get_temp()
+            preheader.append(("MULT", variable, "#4", pointer))
+            preheader.append(("ADD", base, pointer, pointer))
+            for line in lines:
+                self.codes[line] = ("ASSIGN", pointer, self.codes[line + 1][3], None)
+                self.codes[line + 1] = None
+                sites.append(line)
+            for line in definitions.get(variable, []):
+                if not isinstance(self.codes[line], list):
+                    self.codes[line] = [self.codes[line]]
+                self.codes[line].append(("ADD", pointer, f"#{4 * steps[line]}", pointer))
+        self.codes[head - 1] = [self.codes[head - 1]] + preheader
+        return preheader, sites
+
+    def compact(self, head, end, reduced):
+        preheader, sites = reduced
+        self.codes, new_lines = compact_codes(self.code_generator, self.codes)
+        start, stop = new_lines[head], new_lines[end + 1]
+        for line, code in enumerate(self.codes):
+            if start <= line < stop:
+                continue
+            if code[0] == "JP" and code[1] == start:
+                self.codes[line] = ("JP", start - len(preheader), None, None)
+            elif code[0] == "JPF" and code[2] == start:
+                self.codes[line] = ("JPF", code[1], start - len(preheader), None)
+        return new_lines
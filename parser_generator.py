@@ -0,0 +1,202 @@
+import argparse
+import importlib.util
+import re
+import time
+from pathlib import Path
+
+from code_gen import get_action_name
+from lexer import Lexer
+from transition_diagram_parser import (
+    EPSILON,
+    GRAMMAR_PATH,
+    Parser,
+    StackParser,
+    get_grammar,
+    get_grammar_key,
+    replace_file,
+)
+
+GENERATED_PARSER_PATH = "generated_parser.py"
+GENERATOR_VERSION = 3
+
+
+def function_name(non_terminal):
+    return "parse_" + re.sub(r"\W", "_", non_terminal)
+
+
+def action_call(action):
+    return f"cg.{get_action_name(action)}()"
+
+
+def terminal_condition(terminal):
+    if terminal in ["ID", "NUM"]:
+        return f"token.type is TokenType.{terminal}"
+    return f"token.value == {terminal!r} and token.type in VALUE_TOKEN_TYPES"
+
+
+class SourceWriter(object):
+    def __init__(self):
+        self.lines = []
+        self.indent = 0
+
+    def line(self, text=""):
+        self.lines.append("    " * self.indent + text if text else "")
+
+    def block(self, text):
+        self.line(text)
+        self.indent += 1
+
+    def end(self, count=1):
+        self.indent -= count
+
+    def source(self):
+        return "\n".join(self.lines) + "\n"
+
+
+class ParserGenerator(object):
+    def __init__(self, grammar, grammar_key):
+        self.grammar = grammar
+        self.grammar_key = grammar_key
+        self.predict_sets = []
+        self.writer = SourceWriter()
+
+    def generate(self):
+        w = self.writer
+        w.indent = 1
+        w.block("def parse(self):")
+        w.line("self.lexer.get_next_token()")
+        w.line(f"root, eof = self.{function_name(self.grammar.start_symbol)}()")
+        w.line("return ParseTree(root), self.errors")
+        w.end()
+        for production in self.grammar.productions:
+            self.generate_non_terminal(production)
+
+        header = SourceWriter()
+        header.line("# Generated by parser_generator.py from grammar/grammar.txt. Do not edit.")
+        header.line("from lexer import TokenType")
+        header.line("from transition_diagram_parser import (")
+        for name in [
+            "ParseTree",
+            "Parser",
+            "get_terminal",
+        ]:
+            header.line(f"    {name},")
+        header.line(")")
+        header.line()
+        header.line(f"GRAMMAR_KEY = {self.grammar_key!r}")
+        header.line(
+            "VALUE_TOKEN_TYPES = frozenset("
+            "[TokenType.KEYWORD, TokenType.SYMBOL, TokenType.EOF])"
+        )
+        for i, terminals in enumerate(self.predict_sets):
+            header.line(f"PREDICT_{i} = frozenset({sorted(terminals)!r})")
+        header.line()
+        header.line()
+        header.line("class GeneratedParser(Parser):")
+        return header.source() + w.source()
+
+    def generate_non_terminal(self, production):
+        w = self.writer
+        w.line()
+        w.block(f"def {function_name(production.lhs)}(self):")
+        w.line("lexer = self.lexer")
+        w.line("cg = self.code_generator")
+        w.block("while True:")
+        w.line("token = lexer.current_token")
+        w.line("terminal = get_terminal(token)")
+        row = self.grammar.predict_table[production.lhs]
+        for rhs in production.rhs:
+            terminals = {terminal for terminal in row if row[terminal] is rhs}
+            if not terminals:
+                continue
+            self.predict_sets.append(terminals)
+            w.block(f"if terminal in PREDICT_{len(self.predict_sets) - 1}:")
+            self.generate_rhs(production.lhs, rhs)
+            w.end()
+        w.line(f"recovered = self.recover({production.lhs!r}, token)")
+        w.block("if recovered is not None:")
+        w.line("return recovered")
+        w.end(3)
+
+    def generate_rhs(self, lhs, rhs):
+        w = self.writer
+        if len(rhs) == 1 and rhs[0] == EPSILON:
+            w.line(f"return self.epsilon_node({lhs!r}), False")
+            return
+        w.line("children = []")
+        for symbol in rhs:
+            if self.grammar.is_action(symbol):
+                w.line(action_call(symbol))
+            elif self.grammar.is_terminal(symbol):
+                self.generate_terminal(symbol)
+            else:
+                w.line(f"node, eof = self.{function_name(symbol)}()")
+                w.line("children.append(node)")
+                w.block("if eof:")
+                w.line(f"return self.internal_node({lhs!r}, children), True")
+                w.end()
+        w.line(f"return self.internal_node({lhs!r}, children), False")
+
+    def generate_terminal(self, terminal):
+        w = self.writer
+        if terminal == EPSILON:
+            w.line(f"children.append(self.missing_symbol({terminal!r}))")
+            return
+        w.line("token = lexer.current_token")
+        w.block(f"if {terminal_condition(terminal)}:")
+        if terminal == "ID":
+            w.line("cg.last_id = token.value")
+        elif terminal == "NUM":
+            w.line("cg.last_num = token.value")
+        elif terminal in ["int", "void"]:
+            w.line("cg.last_type = token.value")
+        w.line("lexer.get_next_token()")
+        w.line(f"children.append(self.leaf_node({terminal!r}, token))")
+        w.end()
+        w.block("else:")
+        w.line(f"children.append(self.missing_symbol({terminal!r}))")
+        w.end()
+
+
+def generate_parser(grammar_path=GRAMMAR_PATH, output_path=GENERATED_PARSER_PATH):
+    with open(grammar_path, "rb") as f:
+        grammar_key = get_grammar_key(f.read()) + f"-{GENERATOR_VERSION}"
+    source = ParserGenerator(get_grammar(grammar_path), grammar_key).generate()
+    replace_file(output_path, source.encode("utf-8"))
+
+
+def load_generated_parser(grammar_path=GRAMMAR_PATH, output_path=GENERATED_PARSER_PATH):
+    with open(grammar_path, "rb") as f:
+        grammar_key = get_grammar_key(f.read()) + f"-{GENERATOR_VERSION}"
+    try:
+        with open(output_path) as f:
+            up_to_date = f"GRAMMAR_KEY = {grammar_key!r}" in f.read()
+    except OSError:
+        up_to_date = False
+    if not up_to_date:
+        generate_parser(grammar_path, output_path)
+    spec = importlib.util.spec_from_file_location("generated_parser", output_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.GeneratedParser
+
+
+def benchmark(input_path, repeat):
+    parsers = [Parser, StackParser, load_generated_parser()]
+    for parser_class in parsers:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            parser_class(Lexer(Path(input_path))).parse()
+        elapsed = (time.perf_counter() - start) / repeat
+        print(f"{parser_class.__name__}\t{elapsed * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--benchmark", metavar="INPUT")
+    arg_parser.add_argument("--repeat", type=int, default=5)
+    args = arg_parser.parse_args()
+    if args.benchmark:
+        benchmark(args.benchmark, args.repeat)
+    else:
+        generate_parser()
@@ -0,0 +1,71 @@
+from dead_code import DeadCodeEliminator
+from frames import FrameAllocator
+from inliner import Inliner
+from ir import ControlFlowGraph
+from liveness import StateSaveEliminator
+from loops import LoopStrengthReducer
+from peephole import PeepholeOptimizer
+from value_numbering import ValueNumbering
+
+GENERATOR_PASSES = ["fold_constants", "reuse_temps", "reduce_indexing"]
+
+LEVELS = {
+    0: [],
+    1: ["fold_constants", "dead_code", "peephole"],
+    2: [
+        "fold_constants",
+        "reuse_temps",
+        "reduce_indexing",
+        "inline",
+        "dead_code",
+        "value_numbering",
+        "frames",
+        "peephole",
+    ],
+}
+
+
+class PassManager(object):
+    def __init__(self, code_generator, level=0, passes=()):
+        self.code_generator = code_generator
+        self.passes = set(LEVELS[level]) | set(passes)
+
+    def configure(self):
+        for name in GENERATOR_PASSES:
+            setattr(self.code_generator, name, name in self.passes)
+
+    def run(self):
+        code_generator = self.code_generator
+        if "reuse_temps" in self.passes:
+            size = code_generator.temp_pointer - code_generator.temp_start
+            print(f"Data segment: {size} bytes")
+        if "inline" in self.passes:
+            for kind, caller, callee in Inliner(code_generator).optimize():
+                if kind == "tail":
+                    print(f"Tail call in {caller} turned into a jump")
+                else:
+                    print(f"Inlined {callee} into {caller}")
+        if "dead_code" in self.passes:
+            removed, functions = DeadCodeEliminator(code_generator).optimize()
+            for name in functions:
+                print(f"Unreachable function {name} removed")
+            print(f"Dead code elimination removed {removed} instructions")
+        if "value_numbering" in self.passes:
+            removed = ValueNumbering(code_generator).optimize()
+            print(f"Value numbering eliminated {removed} instructions")
+        if "reduce_indexing" in self.passes:
+            for line, count in LoopStrengthReducer(code_generator).optimize():
+                print(f"Loop at line {line}: {count} index computations reduced")
+        if "frames" in self.passes:
+            for name, size in FrameAllocator(code_generator).optimize():
+                print(f"Frame for {name}: {size} bytes")
+        elif "live_saves" in self.passes:
+            report = StateSaveEliminator(code_generator).optimize()
+            for line, callee, saves, eliminated in report:
+                print(f"Call to {callee} at line {line}: {eliminated}/{saves} saves eliminated")
+        if "peephole" in self.passes:
+            removed = PeepholeOptimizer(code_generator).optimize()
+            print(f"Peephole optimizer removed {removed} instructions")
+        graph = ControlFlowGraph(code_generator)
+        if graph.build():
+            graph.lower()
@@ -0,0 +1,278 @@
+from code_gen import ARITHMETIC_OPS
+
+
+def get_int(operand):
+    if isinstance(operand, int):
+        return operand
+    if isinstance(operand, str) and operand.isdigit():
+        return int(operand)
+    return None
+
+
+def references(operand, address):
+    return isinstance(operand, (int, str)) and str(operand).lstrip("@") == str(address)
+
+
+def expand(codes):
+    expansions = []
+    for code in codes:
+        if code is None:
+            expansions.append([])
+        elif isinstance(code, list):
+            expansions.append(code)
+        else:
+            expansions.append([code])
+    return expansions
+
+
+def line_map(codes):
+    new_lines = []
+    line = 0
+    for expansion in expand(codes):
+        new_lines.append(line)
+        line += len(expansion)
+    new_lines.append(line)
+    return new_lines
+
+
+def compact(codes, code_address_lines):
+    expansions = expand(codes)
+    new_lines = line_map(codes)
+    compacted = []
+    compacted_address_lines = set()
+    for i, expansion in enumerate(expansions):
+        for code in expansion:
+            if code[0] == "JP" and get_int(code[1]) is not None:
+                code = ("JP", new_lines[get_int(code[1])], None, None)
+            elif code[0] == "JPF" and get_int(code[2]) is not None:
+                code = ("JPF", code[1], new_lines[get_int(code[2])], None)
+            elif i in code_address_lines and str(code[1]).startswith("#"):
+                code = (code[0], f"#{new_lines[int(code[1][1:])]}", *code[2:])
+                compacted_address_lines.add(len(compacted))
+            compacted.append(code)
+    return compacted, compacted_address_lines
+
+
+def dense_codes(code_generator):
+    codes_generated = code_generator.codes_generated
+    if sorted(codes_generated) != list(range(len(codes_generated))):
+        return None
+    return [codes_generated[line] for line in range(len(codes_generated))]
+
+
+def install_codes(code_generator, codes):
+    code_generator.codes_generated = dict(enumerate(codes))
+    code_generator.program_line = len(codes)
+
+
+def compact_codes(code_generator, codes):
+    new_lines = line_map(codes)
+    codes, code_generator.code_address_lines = compact(
+        codes, code_generator.code_address_lines
+    )
+    code_generator.relocate(new_lines)
+    install_codes(code_generator, codes)
+    return codes, new_lines
+
+
+class PeepholeOptimizer(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.stack_pointer = code_generator.stack_pointer
+        self.expression_temps = code_generator.expression_temps
+        self.code_address_lines = set(code_generator.code_address_lines)
+        self.codes = []
+        self.targets = set()
+
+    def optimize(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return 0
+        self.codes = codes
+        count = len(codes)
+        changed = True
+        while changed:
+            changed = False
+            for rule in [self.fold_stack_pairs, self.thread_jumps, self.fold_copies]:
+                self.targets = self.jump_targets()
+                rule()
+                changed = self.compact() or changed
+        install_codes(self.code_generator, self.codes)
+        return count - len(self.codes)
+
+    def jump_targets(self):
+        targets = {0}
+        for code in self.codes:
+            if code[0] == "JP":
+                targets.add(get_int(code[1]))
+            elif code[0] == "JPF":
+                targets.add(get_int(code[2]))
+        for line in self.code_address_lines:
+            targets.add(int(self.codes[line][1][1:]))
+        return targets
+
+    def compact(self):
+        if None not in self.codes:
+            return False
+        self.codes, _ = compact_codes(self.code_generator, self.codes)
+        self.code_address_lines = self.code_generator.code_address_lines
+        return True
+
+    def is_push(self, line):
+        if line + 1 >= len(self.codes) or line in self.code_address_lines:
+            return False
+        if None in self.codes[line : line + 2]:
+            return False
+        store, move = self.codes[line], self.codes[line + 1]
+        return (
+            store[0] == "ASSIGN"
+            and store[2] == f"@{self.stack_pointer}"
+            and move == ("ADD", "#4", self.stack_pointer, self.stack_pointer)
+        )
+
+    def is_pop(self, line):
+        if line + 1 >= len(self.codes) or None in self.codes[line : line + 2]:
+            return False
+        move, load = self.codes[line], self.codes[line + 1]
+        return (
+            move == ("SUB", self.stack_pointer, "#4", self.stack_pointer)
+            and load[0] == "ASSIGN"
+            and load[1] == f"@{self.stack_pointer}"
+        )
+
+    def has_target(self, start, end):
+        return any(line in self.targets for line in range(start, end))
+
+    def stack_runs(self, line, is_entry):
+        entries = []
+        while is_entry(line):
+            entries.append(line)
+            line += 2
+        return entries
+
+    def fold_stack_pairs(self):
+        line = 0
+        while line < len(self.codes):
+            if self.is_pop(line):
+                pops = self.stack_runs(line, self.is_pop)
+                pushes = self.stack_runs(pops[-1] + 2, self.is_push)
+                self.fold_pop_push(pops, pushes)
+                line = pops[-1] + 2
+            elif self.is_push(line):
+                pushes = self.stack_runs(line, self.is_push)
+                pops = self.stack_runs(pushes[-1] + 2, self.is_pop)
+                self.fold_push_pop(pushes, pops)
+                line = pushes[-1] + 2
+            else:
+                line += 1
+
+    def fold_pop_push(self, pops, pushes):
+        matched = []
+        for pop, push in zip(reversed(pops), pushes):
+            address = self.codes[pop + 1][2]
+            if (
+                not isinstance(address, int)
+                or address == self.stack_pointer
+                or address in matched
+                or self.codes[push][1] != address
+            ):
+                break
+            matched.append(address)
+        if not matched:
+            return
+        count = len(matched)
+        if self.has_target(pops[-count] + 1, pushes[count - 1] + 2):
+            return
+        self.codes[pushes[0]] = (
+            "ADD",
+            f"#{4 * count}",
+            self.stack_pointer,
+            self.stack_pointer,
+        )
+        for line in range(pushes[0] + 1, pushes[count - 1] + 2):
+            self.codes[line] = None
+
+    def fold_push_pop(self, pushes, pops):
+        if not pops:
+            return
+        copies = []
+        limit = len(pops)
+        after = pops[-1] + 2
+        if (
+            after < len(self.codes)
+            and self.codes[after] is not None
+            and self.codes[after][0] == "ADD"
+            and str(self.codes[after][1]).startswith("#")
+            and self.codes[after][2:] == (self.stack_pointer, self.stack_pointer)
+        ):
+            limit -= int(self.codes[after][1][1:]) // 4
+        for push, pop in zip(reversed(pushes), pops[: max(limit, 0)]):
+            value, address = self.codes[push][1], self.codes[pop + 1][2]
+            if (
+                not isinstance(address, int)
+                or address == self.stack_pointer
+                or references(value, self.stack_pointer)
+                or any(references(value, a) or a == address for _, a in copies)
+            ):
+                break
+            copies.append((value, address))
+        if not copies:
+            return
+        count = len(copies)
+        start, end = pushes[-count], pops[count - 1] + 2
+        if self.has_target(start + 1, end):
+            return
+        for line in range(start, end):
+            self.codes[line] = None
+        for line, (value, address) in enumerate(copies, start):
+            if value != address:
+                self.codes[line] = ("ASSIGN", value, address, None)
+
+    def follow_jumps(self, line):
+        seen = set()
+        while (
+            line not in seen
+            and line < len(self.codes)
+            and self.codes[line][0] == "JP"
+            and get_int(self.codes[line][1]) is not None
+        ):
+            seen.add(line)
+            line = get_int(self.codes[line][1])
+        return line
+
+    def thread_jumps(self):
+        for i, code in enumerate(self.codes):
+            if code[0] == "JP" and get_int(code[1]) is not None:
+                target = self.follow_jumps(get_int(code[1]))
+                self.codes[i] = ("JP", target, None, None)
+            elif code[0] == "JPF" and get_int(code[2]) is not None:
+                target = self.follow_jumps(get_int(code[2]))
+                self.codes[i] = ("JPF", code[1], target, None)
+        for i, code in enumerate(self.codes):
+            if code[0] == "JP" and code[1] == i + 1:
+                self.codes[i] = None
+            elif code[0] == "JPF" and code[2] == i + 1:
+                self.codes[i] = None
+
+    def fold_copies(self):
+        uses = {}
+        for code in self.codes:
+            for operand in code[1:]:
+                if operand is not None:
+                    address = str(operand).lstrip("@")
+                    uses[address] = uses.get(address, 0) + 1
+        for i in range(len(self.codes) - 1):
+            code, copy = self.codes[i], self.codes[i + 1]
+            if (
+                code is not None
+                and copy is not None
+                and code[0] in ARITHMETIC_OPS
+                and code[3] in self.expression_temps
+                and uses[str(code[3])] == 2
+                and copy[0] == "ASSIGN"
+                and copy[1] == code[3]
+                and not references(copy[2], code[3])
+                and i + 1 not in self.targets
+            ):
+                self.codes[i] = (code[0], code[1], code[2], copy[2])
+                self.codes[i + 1] = None
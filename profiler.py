@@ -0,0 +1,163 @@
+import argparse
+import json
+import sys
+
+from vm import (
+    IMMEDIATE,
+    JP,
+    JPF,
+    MEMORY_LIMIT,
+    STEP_LIMIT,
+    Machine,
+    execute,
+    load_codes,
+)
+
+ROOT = "<global>"
+
+
+def load_source_map(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+class Profiler(Machine):
+    def __init__(
+        self, codes, source_map, step_limit=STEP_LIMIT, memory_limit=MEMORY_LIMIT
+    ):
+        super().__init__(codes, step_limit, memory_limit)
+        size = len(self.program)
+        self.lines = [None] * size
+        self.names = [None] * size
+        sources = {line: (lineno, name) for line, lineno, name in source_map["instructions"]}
+        lineno, name = None, None
+        for line in range(size):
+            lineno, name = sources.get(line, (lineno, name))
+            self.lines[line], self.names[line] = lineno, name
+        self.entries = {line: name for name, line in source_map["functions"].items()}
+        self.counts = [0] * size
+        self.calls = {}
+        self.stack = []
+        self.stacks = {}
+        self.back_edges = {}
+
+    def interpret(self, step_limit):
+        program = self.program
+        size = len(program)
+        stack = self.stack
+        stacks = self.stacks
+        key = ";".join([ROOT, *stack])
+        while self.steps < step_limit:
+            line = self.pc
+            if not 0 <= line < size:
+                return True
+            self.counts[line] += 1
+            stacks[key] = stacks.get(key, 0) + 1
+            halted = Machine.interpret(self, self.steps + 1)
+            op, ma, a, mb, b = program[line][:5]
+            if op == JP and ma == IMMEDIATE and a in self.entries:
+                stack.append(self.entries[a])
+                self.calls[stack[-1]] = self.calls.get(stack[-1], 0) + 1
+                key = ";".join([ROOT, *stack])
+            elif op == JP and ma != IMMEDIATE and stack:
+                stack.pop()
+                key = ";".join([ROOT, *stack])
+            elif (op == JP or op == JPF) and self.pc <= line:
+                edge = (self.pc, line)
+                self.back_edges[edge] = self.back_edges.get(edge, 0) + 1
+            if halted:
+                return True
+        return False
+
+    def report(self):
+        lines = {}
+        functions = {}
+        for line, count in enumerate(self.counts):
+            if not count:
+                continue
+            name = self.names[line] or ROOT
+            key = (self.lines[line], name)
+            lines[key] = lines.get(key, 0) + count
+            functions[name] = functions.get(name, 0) + count
+        loops = []
+        for (start, end), iterations in self.back_edges.items():
+            loops.append(
+                {
+                    "function": self.names[start] or ROOT,
+                    "line": self.lines[start],
+                    "end_line": self.lines[end],
+                    "iterations": iterations,
+                    "instructions": sum(self.counts[start : end + 1]),
+                }
+            )
+        loops.sort(key=lambda loop: loop["instructions"], reverse=True)
+        return {
+            "steps": self.steps,
+            "lines": [
+                {"line": lineno, "function": name, "instructions": count}
+                for (lineno, name), count in sorted(
+                    lines.items(), key=lambda item: (item[0][0] or 0, item[0][1])
+                )
+            ],
+            "functions": [
+                {
+                    "name": name,
+                    "instructions": count,
+                    "calls": self.calls.get(name, 0),
+                }
+                for name, count in sorted(
+                    functions.items(), key=lambda item: item[1], reverse=True
+                )
+            ],
+            "loops": loops,
+        }
+
+    def to_stacks(self, path):
+        with open(path, "w") as f:
+            for key, count in sorted(self.stacks.items()):
+                f.write(f"{key} {count}\n")
+
+
+def print_report(report, top, stream=sys.stdout):
+    stream.write(f"Executed {report['steps']} instructions\n")
+    stream.write("Functions:\n")
+    for function in report["functions"][:top]:
+        stream.write(
+            f"    {function['name']}: {function['instructions']} instructions, "
+            f"{function['calls']} calls\n"
+        )
+    stream.write("Lines:\n")
+    lines = sorted(report["lines"], key=lambda line: line["instructions"], reverse=True)
+    for line in lines[:top]:
+        stream.write(
+            f"    line {line['line']} ({line['function']}): "
+            f"{line['instructions']} instructions\n"
+        )
+    stream.write("Hot loops:\n")
+    for loop in report["loops"][:top]:
+        stream.write(
+            f"    lines {loop['line']}-{loop['end_line']} ({loop['function']}): "
+            f"{loop['iterations']} iterations, {loop['instructions']} instructions\n"
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("path", nargs="?", default="output.txt")
+    arg_parser.add_argument("--source-map", default="source_map.json")
+    arg_parser.add_argument("--json", default="profile.json")
+    arg_parser.add_argument("--stacks", default="profile.folded")
+    arg_parser.add_argument("--top", type=int, default=10)
+    arg_parser.add_argument("--steps", type=int, default=STEP_LIMIT)
+    arg_parser.add_argument("--memory", type=int, default=MEMORY_LIMIT)
+    args = arg_parser.parse_args()
+    profiler = Profiler(
+        load_codes(args.path), load_source_map(args.source_map), args.steps, args.memory
+    )
+    succeeded = execute(profiler)
+    report = profiler.report()
+    with open(args.json, "w") as f:
+        json.dump(report, f, indent=2)
+    profiler.to_stacks(args.stacks)
+    print_report(report, args.top)
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,249 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from batch import PASSES, compile_job, init_worker
+from compiler import PARSERS
+from pass_manager import LEVELS
+
+DEFAULT_SOCKET = "compiler.sock"
+STREAM_LIMIT = 1 << 28
+LATENCY_WINDOW = 1000
+OUTPUT_FILES = {
+    "output": "output.txt",
+    "parse_tree": "parse_tree.txt",
+    "source_map": "source_map.json",
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class LatencyStats(object):
+    def __init__(self, window=LATENCY_WINDOW):
+        self.requests = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def record(self, seconds, failed):
+        self.requests += 1
+        self.failed += failed
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.latencies.append(seconds)
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        return {
+            "requests": self.requests,
+            "failed": self.failed,
+            "in_flight": self.in_flight,
+            "mean_ms": self.total / self.requests * 1000 if self.requests else 0,
+            "p50_ms": percentile(latencies, 0.5) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class CompileServer(object):
+    def __init__(self, socket_path=DEFAULT_SOCKET, jobs=None, parser_name="recursive"):
+        self.socket_path = socket_path
+        self.jobs = jobs or os.cpu_count() or 1
+        self.parser_name = parser_name
+        self.stats = LatencyStats()
+        self.executor = None
+
+    def start_executor(self):
+        self.executor = ProcessPoolExecutor(
+            self.jobs, initializer=init_worker, initargs=(self.parser_name,)
+        )
+
+    def restart_executor(self, executor):
+        if self.executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            self.start_executor()
+
+    def submit(self, job):
+        loop = asyncio.get_running_loop()
+        try:
+            return loop.run_in_executor(self.executor, compile_job, job)
+        except BrokenProcessPool:
+            self.restart_executor(self.executor)
+            return loop.run_in_executor(self.executor, compile_job, job)
+
+    async def serve(self):
+        init_worker(self.parser_name)
+        self.start_executor()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = await asyncio.start_unix_server(
+            self.handle, self.socket_path, limit=STREAM_LIMIT
+        )
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, server.close)
+        print(f"Serving on {self.socket_path} with {self.jobs} workers", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self.executor.shutdown(cancel_futures=True)
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                response = await self.respond(line)
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, line):
+        try:
+            request = json.loads(line)
+            command = request.get("command", "compile")
+            if command == "stats":
+                return self.stats.summary()
+            if command == "compile":
+                return await self.compile(request)
+            return {"error": f"Invalid command {command}"}
+        except (ValueError, KeyError, TypeError, AttributeError, OSError) as e:
+            return {"error": f"Invalid request: {e!r}"}
+
+    async def compile(self, request):
+        options = {
+            "build_tree": request.get("tree", True),
+            "level": request.get("level", 0),
+            "passes": request.get("passes", []),
+            "source_map": request.get("source_map", False),
+        }
+        if options["level"] not in LEVELS or not set(options["passes"]) <= set(PASSES):
+            return {"error": "Invalid optimization options"}
+        source = request.get("source")
+        if not isinstance(source, str):
+            return {"error": "Invalid source"}
+        start = time.perf_counter()
+        self.stats.in_flight += 1
+        failed = True
+        executor = self.executor
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                input_path = Path(directory) / "input.txt"
+                input_path.write_text(source)
+                future = self.submit((input_path, directory, options))
+                executor = self.executor
+                result = await future
+                response = {
+                    "errors": result["errors"],
+                    "exception": result["exception"],
+                    "report": result["report"],
+                }
+                for key, name in OUTPUT_FILES.items():
+                    path = Path(directory) / name
+                    if path.exists():
+                        response[key] = path.read_text()
+            failed = result["exception"] is not None
+        except BrokenProcessPool as e:
+            self.restart_executor(executor)
+            response = {"error": f"Worker pool failed: {e}"}
+        finally:
+            self.stats.in_flight -= 1
+            seconds = time.perf_counter() - start
+            self.stats.record(seconds, failed)
+        response["seconds"] = seconds
+        return response
+
+
+async def request(message, socket_path=DEFAULT_SOCKET):
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=STREAM_LIMIT)
+    try:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def run_client(args):
+    message = {
+        "command": "compile",
+        "source": Path(args.input).read_text(),
+        "tree": not args.no_tree,
+        "level": args.level,
+        "passes": args.passes,
+        "source_map": args.source_map,
+    }
+    response = asyncio.run(request(message, args.socket))
+    if "error" in response:
+        print(response["error"], file=sys.stderr)
+        return 1
+    sys.stdout.write(response["report"])
+    if response["exception"] is not None:
+        sys.stderr.write(response["exception"])
+        return 1
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for key, name in OUTPUT_FILES.items():
+        if key in response:
+            (output_dir / name).write_text(response[key])
+    if response["errors"]:
+        with open(output_dir / "errors.txt", "w") as f:
+            f.writelines(f"{error}\n" for error in response["errors"])
+    return 0
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve")
+    serve_parser.add_argument("-j", "--jobs", type=int)
+    serve_parser.add_argument(
+        "--parser", choices=[*PARSERS, "generated"], default="recursive"
+    )
+    compile_parser = commands.add_parser("compile")
+    compile_parser.add_argument("input", nargs="?", default="input.txt")
+    compile_parser.add_argument("-o", "--output", default=".")
+    compile_parser.add_argument("--no-tree", action="store_true")
+    compile_parser.add_argument(
+        "-O", dest="level", type=int, choices=LEVELS, default=0
+    )
+    compile_parser.add_argument(
+        "--pass", dest="passes", action="append", choices=PASSES, default=[]
+    )
+    compile_parser.add_argument("--source-map", action="store_true")
+    commands.add_parser("stats")
+    args = arg_parser.parse_args()
+    if args.command == "serve":
+        try:
+            asyncio.run(CompileServer(args.socket, args.jobs, args.parser).serve())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "compile":
+        sys.exit(run_client(args))
+    else:
+        print(json.dumps(asyncio.run(request({"command": "stats"}, args.socket)), indent=2))
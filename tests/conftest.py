@@ -0,0 +1,43 @@
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture
+def compile_source(tmp_path, monkeypatch):
+    from compiler import compile_program, get_parser_class
+
+    monkeypatch.chdir(ROOT)
+    builds = []
+
+    def compile_source(source, parser_name="recursive", **options):
+        directory = tmp_path / f"build{len(builds)}"
+        directory.mkdir()
+        builds.append(directory)
+        input_path = directory / "input.txt"
+        input_path.write_text(source)
+        report = io.StringIO()
+        with contextlib.redirect_stdout(report):
+            compile_program(
+                get_parser_class(parser_name), input_path, directory, **options
+            )
+        return directory / "output.txt", report.getvalue()
+
+    return compile_source
+
+
+@pytest.fixture
+def run_source(compile_source):
+    from vm import Machine, load_codes
+
+    def run_source(source, **options):
+        path, report = compile_source(source, **options)
+        return Machine(load_codes(path)).run(), report
+
+    return run_source
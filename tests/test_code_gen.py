@@ -0,0 +1,72 @@
+import re
+
+import pytest
+
+from code_gen import get_action_name
+
+LOOP_HEAD = """
+void main(void) {
+    int x;
+    x = 1;
+    repeat {
+        output(x);
+        x = x + 1;
+    } until (x == 3)
+    output(x);
+}
+"""
+
+AFTER_BREAK = """
+void main(void) {
+    int i; int x; int y;
+    i = 0; x = 1;
+    repeat {
+        x = 2;
+        if (i == 1) break; else i = i + 1;
+        x = 3;
+    } until (i == 5)
+    y = x + 1;
+    output(y);
+}
+"""
+
+
+@pytest.mark.parametrize(
+    "source, expected", [(LOOP_HEAD, [1, 2, 3]), (AFTER_BREAK, [3])]
+)
+def test_constants_invalidated_at_join(run_source, source, expected):
+    assert run_source(source)[0] == expected
+    assert run_source(source, passes=["fold_constants"])[0] == expected
+
+
+NESTED = """
+void main(void) {
+    int a; int b; int c; int d;
+    a = 7; b = 3; c = 2; d = 5;
+%s}
+"""
+
+EXPRESSION = "    output((a + b) * (c + d * (a - b)) - (a * (b + c * (d - a))));\n"
+
+
+def data_segment(report):
+    return int(re.search(r"Data segment: (\d+) bytes", report).group(1))
+
+
+def test_temps_recycled_across_nested_expressions(run_source):
+    once = NESTED % EXPRESSION
+    three_times = NESTED % (EXPRESSION * 3)
+    expected, _ = run_source(three_times)
+    output, report = run_source(three_times, passes=["reuse_temps"])
+    assert output == expected
+    assert data_segment(report) == data_segment(
+        run_source(once, passes=["reuse_temps"])[1]
+    )
+
+
+def test_action_names():
+    assert get_action_name("#break") == "save_break"
+    assert get_action_name("#jp_break") == "jp_break"
+    for action in ["#break_error", "#__init__", "#parser"]:
+        with pytest.raises(Exception, match=f"Invalid action {action}"):
+            get_action_name(action)
@@ -0,0 +1,17 @@
+SOURCE = """
+int unused(int a) { return a + 1; }
+int helper(int a) { return a * 2; }
+int caller(int a) { return helper(a) + 1; }
+void main(void) {
+    output(caller(4));
+}
+"""
+
+
+def test_only_unreachable_functions_are_removed(run_source):
+    expected, _ = run_source(SOURCE)
+    output, report = run_source(SOURCE, passes=["dead_code"])
+    assert output == expected == [9]
+    assert "Unreachable function unused removed" in report
+    assert "Unreachable function helper removed" not in report
+    assert "Unreachable function caller removed" not in report
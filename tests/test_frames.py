@@ -0,0 +1,61 @@
+import pytest
+
+RECURSIVE_LOCAL_ARRAY = """
+int fill(int a[], int n) {
+    int b[8]; int i;
+    if (n == 0) return 0;
+    i = 0;
+    repeat {
+        b[i] = n * 10 + i;
+        i = i + 1;
+    } until (i == 3)
+    a[n] = b[2] + b[0];
+    i = b[1];
+    return i + fill(a, n - 1);
+}
+void main(void) {
+    int a[5];
+    output(fill(a, 4));
+    output(a[1] + a[4]);
+}
+"""
+
+PARAMETERS = """
+int mix(int x, int y, int z) {
+    int t;
+    t = x * 100 + y * 10 + z;
+    if (x < y) t = t + mix(y, x, z + 1);
+    return t;
+}
+void main(void) {
+    output(mix(1, 2, 3));
+    output(mix(5, 4, 3) + mix(0, 9, 1));
+}
+"""
+
+ARRAY_PER_CALL = """
+int sum(int n) {
+    int b[8];
+    if (n == 0) return 0;
+    b[7] = n;
+    return sum(n - 1) + b[7];
+}
+void main(void) {
+    output(sum(4));
+}
+"""
+
+
+@pytest.mark.parametrize(
+    "source, function", [(RECURSIVE_LOCAL_ARRAY, "fill"), (PARAMETERS, "mix")]
+)
+def test_frames_keep_output(run_source, source, function):
+    expected, _ = run_source(source)
+    output, report = run_source(source, passes=["frames"])
+    assert output == expected
+    assert f"Frame for {function}:" in report
+
+
+def test_recursive_calls_get_their_own_arrays(run_source):
+    output, _ = run_source(ARRAY_PER_CALL, passes=["frames"])
+    assert output == [10]
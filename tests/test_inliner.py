@@ -0,0 +1,39 @@
+import pytest
+
+TAIL_CALL = """
+int count(int n, int total) {
+    if (n == 0) return total;
+    return count(n - 1, total + n);
+}
+void main(void) {
+    output(count(10, 0));
+    output(count(3, 5));
+}
+"""
+
+LOCAL_ARRAY = """
+int pick(int i) {
+    int b[1];
+    b[0] = i * 3;
+    return b[0];
+}
+void main(void) {
+    int x;
+    x = pick(2);
+    output(x + pick(1));
+}
+"""
+
+
+@pytest.mark.parametrize(
+    "source, message",
+    [
+        (TAIL_CALL, "Tail call in count turned into a jump"),
+        (LOCAL_ARRAY, "Inlined pick into main"),
+    ],
+)
+def test_inlining_keeps_output(run_source, source, message):
+    expected, _ = run_source(source)
+    output, report = run_source(source, passes=["fold_constants", "inline"])
+    assert output == expected
+    assert message in report
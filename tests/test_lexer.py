@@ -0,0 +1,33 @@
+import tracemalloc
+
+from lexer import Lexer, StreamingLexer
+
+
+def tokens(lexer):
+    return [(token, lexer.lineno) for token in lexer.tokens()]
+
+
+def peak_memory(path, chunk_size):
+    tracemalloc.start()
+    try:
+        for _ in StreamingLexer(path, chunk_size).tokens():
+            pass
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def test_streaming_matches_lexer_without_whitespace(tmp_path):
+    path = tmp_path / "input.txt"
+    path.write_text("int a[10];a[0]=1;/*x*/" * 50 + "b==c/*1*2" + "*/x" * 20 + "/**/y")
+    expected = tokens(Lexer(path))
+    for chunk_size in [1, 2, 3, 7, 64]:
+        assert tokens(StreamingLexer(path, chunk_size)) == expected
+
+
+def test_streaming_memory_is_flat_without_whitespace(tmp_path):
+    small, large = tmp_path / "small.txt", tmp_path / "large.txt"
+    small.write_text("x=y+1;" * 20000)
+    large.write_text("x=y+1;" * 160000)
+    assert peak_memory(large, 1024) < 2 * peak_memory(small, 1024)
+    assert peak_memory(large, 1024) < large.stat().st_size // 4
@@ -0,0 +1,20 @@
+import re
+
+NESTED_CALL = """
+int g(int a) { return a * 2; }
+int f(int a, int b) { return a + b; }
+void main(void) {
+    int x; int y; int z;
+    x = 3; y = 4; z = 5;
+    output(f(g(x), y));
+    output(z);
+}
+"""
+
+
+def test_nested_call_keeps_pending_values(run_source):
+    expected, _ = run_source(NESTED_CALL)
+    output, report = run_source(NESTED_CALL, passes=["live_saves"])
+    assert output == expected == [10, 5]
+    calls = re.findall(r"Call to (\w+) at line \d+: (\d+/\d+) saves", report)
+    assert calls == [("output", "3/4"), ("f", "3/4"), ("g", "2/4"), ("output", "7/7")]
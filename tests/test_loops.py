@@ -0,0 +1,77 @@
+import pytest
+
+DOWN_COUNTING = """
+void main(void) {
+    int a[10]; int i;
+    i = 8;
+    repeat {
+        a[i] = i * 3;
+        i = i - 2;
+    } until (i < 0)
+    i = 0;
+    repeat {
+        output(a[i]);
+        i = i + 2;
+    } until (8 < i)
+}
+"""
+
+UPDATE_IN_IF = """
+void main(void) {
+    int a[12]; int i; int s;
+    i = 0; s = 0;
+    repeat {
+        s = s + a[i];
+        if (i < 4) {
+            a[i] = s + i;
+            i = i + 1;
+        } else i = i + 3;
+    } until (9 < i)
+    i = 0;
+    repeat {
+        output(a[i]);
+        i = i + 1;
+    } until (i == 12)
+}
+"""
+
+UNREDUCED_UPDATE_IN_IF = """
+void main(void) {
+    int a[12]; int i;
+    i = 0;
+    repeat {
+        a[i] = i;
+        if (i < 4) i = i + 1; else i = i + 2;
+    } until (9 < i)
+    output(a[3] + a[6]);
+}
+"""
+
+ENTERED_BY_JUMP = """
+void main(void) {
+    int a[6]; int i; int y;
+    i = 0;
+    if (i < 1) y = 2; else y = 3;
+    repeat {
+        a[i] = i * y;
+        i = i + 1;
+    } until (i == 6)
+    output(a[1] + a[5]);
+}
+"""
+
+
+@pytest.mark.parametrize(
+    "source, reduced",
+    [
+        (DOWN_COUNTING, True),
+        (UPDATE_IN_IF, True),
+        (UNREDUCED_UPDATE_IN_IF, False),
+        (ENTERED_BY_JUMP, True),
+    ],
+)
+def test_strength_reduction_keeps_output(run_source, source, reduced):
+    expected, _ = run_source(source)
+    output, report = run_source(source, passes=["reduce_indexing"])
+    assert output == expected
+    assert ("index computations reduced" in report) == reduced
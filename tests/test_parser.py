@@ -0,0 +1,47 @@
+import os
+import pickle
+
+import pytest
+
+import transition_diagram_parser
+from compiler import compile_program, get_parser_class
+from conftest import ROOT
+from parser_generator import generate_parser
+
+PARSER_NAMES = ["recursive", "stack", "generated"]
+
+
+@pytest.fixture(autouse=True)
+def grammar_directory():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield
+    os.chdir(cwd)
+
+
+@pytest.mark.parametrize("parser_name", PARSER_NAMES)
+def test_recover_from_illegal_break(tmp_path, parser_name):
+    input_path = tmp_path / "input.txt"
+    input_path.write_text("void main(void){ int a; a = 3 break; }")
+    errors = compile_program(get_parser_class(parser_name), input_path, tmp_path)
+    assert [str(error) for error in errors] == ["#1 : syntax error, illegal break"]
+    assert (tmp_path / "output.txt").exists()
+
+
+def test_rebuild_cache_pickled_against_missing_module(tmp_path, monkeypatch):
+    monkeypatch.setattr(transition_diagram_parser, "GRAMMARS", {})
+    cache_path = tmp_path / "grammar.cache"
+    cache_path.write_bytes(b"cmissing_module\nGrammar\n.")
+    grammar = transition_diagram_parser.get_grammar(cache_path=cache_path)
+    assert grammar.start_symbol == "Program"
+    with open(cache_path, "rb") as f:
+        assert pickle.load(f)[1].start_symbol == "Program"
+    assert [path.name for path in tmp_path.iterdir()] == ["grammar.cache"]
+
+
+def test_generate_parser_replaces_output(tmp_path):
+    output_path = tmp_path / "generated_parser.py"
+    output_path.write_text("stale")
+    generate_parser(output_path=output_path)
+    assert "GRAMMAR_KEY = " in output_path.read_text()
+    assert [path.name for path in tmp_path.iterdir()] == ["generated_parser.py"]
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from conftest import ROOT
+from server import CompileServer, request
+
+SOURCE = "void main(void) { output(3 + 4); }"
+
+
+async def wait_for_socket(path):
+    for _ in range(500):
+        if path.exists():
+            return
+        await asyncio.sleep(0.01)
+    raise TimeoutError(path)
+
+
+async def exercise(socket_path):
+    server = CompileServer(str(socket_path), jobs=1)
+    task = asyncio.create_task(server.serve())
+    try:
+        await wait_for_socket(socket_path)
+        socket = str(socket_path)
+        responses = {
+            "valid": await request({"source": SOURCE}, socket),
+            "source": await request({"source": 5}, socket),
+            "missing": await request({"level": 0}, socket),
+            "level": await request({"source": SOURCE, "level": 7}, socket),
+            "command": await request({"command": "link"}, socket),
+            "json": await request("not a request", socket),
+        }
+        for process in list(server.executor._processes.values()):
+            process.kill()
+        responses["broken"] = await request({"source": SOURCE}, socket)
+        responses["recovered"] = await request({"source": SOURCE}, socket)
+        responses["stats"] = await request({"command": "stats"}, socket)
+        return responses
+    finally:
+        task.cancel()
+        await task
+
+
+@pytest.fixture
+def responses(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    return asyncio.run(exercise(tmp_path / "compiler.sock"))
+
+
+def test_protocol(responses):
+    valid = responses["valid"]
+    assert valid["errors"] == [] and valid["exception"] is None
+    assert "(PRINT" in valid["output"]
+    assert responses["source"] == {"error": "Invalid source"}
+    assert responses["missing"] == {"error": "Invalid source"}
+    assert responses["level"] == {"error": "Invalid optimization options"}
+    assert responses["command"] == {"error": "Invalid command link"}
+    assert responses["json"]["error"].startswith("Invalid request")
+
+
+def test_pool_recovery_and_stats(responses):
+    assert responses["recovered"]["exception"] is None
+    assert "(PRINT" in responses["recovered"]["output"]
+    stats = responses["stats"]
+    assert stats["requests"] == 3 and stats["in_flight"] == 0
+    assert stats["failed"] == int("error" in responses["broken"])
@@ -0,0 +1,56 @@
+import re
+
+import pytest
+
+SOURCE = """
+void main(void) {
+    int a[5]; int i; int x; int y; int z;
+    i = 2; a[i] = 3; x = 4; y = 5;
+    z = a[i] + a[i] * (x + y) - (x + y);
+    output(z);
+}
+"""
+
+FUNCTION_SOURCE = """
+int f(int i, int x, int y) {
+    int a[5]; int z;
+    a[i] = 3;
+    z = a[i] + a[i] * (x + y) - (x + y);
+    output(x + y);
+    return z + (x + y);
+}
+void main(void) {
+    output(f(2, 4, 5));
+}
+"""
+
+CALL_SOURCE = """
+int g(int a) { return a * 2; }
+int f(int x, int y) {
+    return (x + y) * ((x + y) + g(x));
+}
+void main(void) {
+    output(f(4, 5));
+}
+"""
+
+
+def eliminated(report):
+    return int(re.search(r"Value numbering eliminated (\d+)", report).group(1))
+
+
+@pytest.mark.parametrize("source", [SOURCE, FUNCTION_SOURCE])
+@pytest.mark.parametrize(
+    "passes", [["value_numbering"], ["value_numbering", "live_saves"]]
+)
+def test_common_subexpressions_are_shared(run_source, source, passes):
+    expected, _ = run_source(source)
+    output, report = run_source(source, passes=passes)
+    assert output == expected
+    assert eliminated(report) >= 1
+
+
+def test_values_live_across_calls_are_kept(run_source):
+    expected, _ = run_source(CALL_SOURCE)
+    output, _ = run_source(CALL_SOURCE, passes=["value_numbering", "frames"])
+    assert output == expected
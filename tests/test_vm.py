@@ -0,0 +1,105 @@
+import io
+import subprocess
+
+import pytest
+
+from conftest import ROOT
+from vm import CompiledMachine, Machine, execute, load_codes
+
+TESTER = ROOT / "tester_linux.out"
+
+PROGRAMS = {
+    "arithmetic": """
+void main(void) {
+    int a; int b;
+    a = 2147483647; b = 0 - 7;
+    output(a + 1);
+    output(a * b);
+    output(b - a);
+    output(b < a);
+    output(a == b);
+}
+""",
+    "recursion": """
+int fib(int n) {
+    if (n < 2) return n;
+    return fib(n - 1) + fib(n - 2);
+}
+void main(void) {
+    output(fib(12));
+}
+""",
+    "arrays": """
+int sum(int a[], int n) {
+    int i; int s;
+    i = 0; s = 0;
+    repeat {
+        s = s + a[i];
+        i = i + 1;
+    } until (i == n)
+    return s;
+}
+void main(void) {
+    int a[20]; int i;
+    i = 0;
+    repeat {
+        a[i] = i * i;
+        i = i + 1;
+        if (i == 15) break; else i = i;
+    } until (i == 20)
+    output(sum(a, 20));
+}
+""",
+    "fault": """
+void main(void) {
+    int i; int x;
+    i = 0; x = 1;
+    output(x);
+    repeat {
+        x = 2;
+        if (i == 0) break; else x = 3;
+        i = i + 1;
+    } until (x == 3)
+    output(x);
+}
+""",
+}
+
+
+def printed(text):
+    return [
+        line
+        for line in text.splitlines()
+        if line.startswith("PRINT") or line.startswith("ERROR")
+    ]
+
+
+def run_machine(machine_class, path):
+    stream = io.StringIO()
+    execute(machine_class(load_codes(path)), stream)
+    return printed(stream.getvalue())
+
+
+@pytest.fixture(params=sorted(PROGRAMS))
+def program(request, compile_source):
+    path, _ = compile_source(PROGRAMS[request.param])
+    return path
+
+
+def test_machine_matches_tester(program):
+    try:
+        result = subprocess.run(
+            [str(TESTER)],
+            cwd=program.parent,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            timeout=60,
+        )
+    except OSError:
+        pytest.skip("tester is not runnable here")
+    assert run_machine(Machine, program) == printed(result.stdout)
+
+
+def test_compiled_machine_matches_machine(program):
+    assert run_machine(CompiledMachine, program) == run_machine(Machine, program)
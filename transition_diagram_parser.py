@@ -1,13 +1,18 @@
+import hashlib
+import os
+import pickle
 from abc import abstractmethod
 from enum import Enum
 from typing import List, Dict, Set
 
-from anytree import Node
-
 from lexer import Token, TokenType
 from code_gen import CodeGenerator
 
 EPSILON = "EPSILON"
+GRAMMAR_PATH = "grammar/grammar.txt"
+GRAMMAR_CACHE_PATH = "grammar/grammar.cache"
+GRAMMAR_CACHE_VERSION = 1
+GRAMMARS = {}
 
 
 class Production(object):
@@ -40,6 +45,7 @@ class Grammar(object):
         self.actions = actions
         self.firsts = firsts
         self.follows = follows
+        self.predict_table = self.build_predict_table()
 
     def get_productions(self, lhs: str):
         for production in self.productions:
@@ -94,8 +100,27 @@ class Grammar(object):
             entry_tokens.update(self.get_follow(lhs))
         return entry_tokens
 
+    def build_predict_table(self):
+        predict_table = {}
+        for production in self.productions:
+            row = predict_table.setdefault(production.lhs, {})
+            for rhs in production.rhs:
+                for terminal in self.entry_tokens_for_rhs(production.lhs, rhs):
+                    if terminal in row:
+                        raise Exception(
+                            f"LL(1) conflict in {production.lhs} on {terminal}: "
+                            f"{' '.join(row[terminal])} / {' '.join(rhs)}"
+                        )
+                    row[terminal] = rhs
+        return predict_table
+
+    def predict(self, lhs: str, terminal: str):
+        return self.predict_table[lhs].get(terminal)
+
 
 class ParseTreeNode(object):
+    __slots__ = ("symbol",)
+
     def __init__(self, symbol: str):
         self.symbol = symbol
 
@@ -103,40 +128,73 @@ class ParseTreeNode(object):
     def to_anytree(self, parent=None):
         pass
 
+    def label(self):
+        return self.symbol
+
+    def visible_children(self):
+        return []
+
 
 class ParseTreeEpsilonNode(ParseTreeNode):
+    __slots__ = ()
+
     def __init__(self, symbol: str):
         super().__init__(symbol)
 
     def to_anytree(self, parent=None):
+        from anytree import Node
+
         root = Node(self.symbol, parent=parent)
         Node(EPSILON.lower(), parent=root)
         return root
 
+    def visible_children(self):
+        return [EPSILON_LEAF]
+
 
 class ParseTreeLeafNode(ParseTreeNode):
+    __slots__ = ("token",)
+
     def __init__(self, symbol: str, token: Token):
         super().__init__(symbol)
         self.token = token
 
     def to_anytree(self, parent=None):
+        from anytree import Node
+
+        return Node(self.label(), parent=parent)
+
+    def label(self):
         if self.token.type == TokenType.EOF:
-            return Node(self.token.value, parent=parent)
-        return Node(f"({self.token.type.value}, {self.token.value})", parent=parent)
+            return self.token.value
+        return f"({self.token.type.value}, {self.token.value})"
 
 
 class ParseTreeInternalNode(ParseTreeNode):
+    __slots__ = ("children",)
+
     def __init__(self, symbol: str, children: List[ParseTreeNode]):
         super().__init__(symbol)
         self.children = children
 
     def to_anytree(self, parent=None):
+        from anytree import Node
+
         node = Node(f"{self.symbol}", parent=parent)
-        for child in self.children:
-            if not isinstance(child, ParseTreeSyntaxErrorNode):
-                child.to_anytree(parent=node)
+        for child in self.visible_children():
+            child.to_anytree(parent=node)
         return node
 
+    def visible_children(self):
+        return [
+            child
+            for child in self.children
+            if not isinstance(child, ParseTreeSyntaxErrorNode)
+        ]
+
+
+EPSILON_LEAF = ParseTreeInternalNode(EPSILON.lower(), [])
+
 
 class SyntaxErrorType(Enum):
     IllegalSymbol = 1
@@ -145,6 +203,8 @@ class SyntaxErrorType(Enum):
 
 
 class ParseTreeSyntaxErrorNode(ParseTreeNode):
+    __slots__ = ("line_number", "error_type")
+
     def __init__(self, symbol: str, line_number: int, error_type: SyntaxErrorType):
         super().__init__(symbol)
         self.line_number = line_number
@@ -160,6 +220,8 @@ class ParseTreeSyntaxErrorNode(ParseTreeNode):
 
 
 class ParseTree(object):
+    __slots__ = ("root",)
+
     def __init__(self, root: ParseTreeNode):
         self.root = root
 
@@ -169,10 +231,36 @@ class ParseTree(object):
     def get_errors(self):
         return self.root.get_errors()
 
+    def render_lines(self):
+        yield self.root.label()
+        stack = [("", self.root.visible_children()[::-1])]
+        while stack:
+            indent, children = stack[-1]
+            if not children:
+                stack.pop()
+                continue
+            child = children.pop()
+            if children:
+                yield f"\n{indent}├── {child.label()}"
+                indent += "│   "
+            else:
+                yield f"\n{indent}└── {child.label()}"
+                indent += "    "
+            grandchildren = child.visible_children()
+            if grandchildren:
+                stack.append((indent, grandchildren[::-1]))
+
+    def render(self, f):
+        f.writelines(self.render_lines())
+
 
-def compile_productions():
+def skip_node(*args):
+    return None
+
+
+def compile_productions(grammar_text):
     productions = []
-    for line in open("grammar/grammar.txt"):
+    for line in grammar_text.splitlines():
         line = line.strip()
         lhs, rhs_raw = line.split(" ⟶ ")
         rhs = [r.split(" ") for r in rhs_raw.split(" | ")]
@@ -198,52 +286,139 @@ def get_terminals_and_non_terminals_and_actions(productions):
     return terminals, non_terminals, actions
 
 
-def get_firsts():
-    with open("grammar/first.txt") as f:
-        header = f.readline().strip().split()[1:]
-        firsts = {}
-        for line in f:
-            line = line.strip().split()
-            symbol = line[0]
-            answers = line[1:]
-            firsts[symbol] = set(
-                header[i] for i, answer in enumerate(answers) if answer == "+"
-            )
+def first_of_sequence(symbols, firsts):
+    first = set()
+    for symbol in symbols:
+        if symbol.startswith("#") or symbol == EPSILON:
+            continue
+        if symbol not in firsts:
+            first.add(symbol)
+            return first
+        first.update(firsts[symbol] - {EPSILON})
+        if EPSILON not in firsts[symbol]:
+            return first
+    first.add(EPSILON)
+    return first
+
+
+def compute_firsts(productions):
+    firsts = {production.lhs: set() for production in productions}
+    changed = True
+    while changed:
+        changed = False
+        for production in productions:
+            first = firsts[production.lhs]
+            size = len(first)
+            for rhs in production.rhs:
+                first.update(first_of_sequence(rhs, firsts))
+            changed = changed or len(first) != size
     return firsts
 
 
-def get_follows():
-    with open("grammar/follow.txt") as f:
-        header = f.readline().strip().split()[1:]
-        follows = {}
-        for line in f:
-            line = line.strip().split()
-            symbol = line[0]
-            answers = line[1:]
-            follows[symbol] = set(
-                header[i] for i, answer in enumerate(answers) if answer == "+"
-            )
+def compute_follows(productions, start_symbol, firsts):
+    follows = {production.lhs: set() for production in productions}
+    follows[start_symbol].add("$")
+    changed = True
+    while changed:
+        changed = False
+        for production in productions:
+            for rhs in production.rhs:
+                for i, symbol in enumerate(rhs):
+                    if symbol not in follows:
+                        continue
+                    follow = follows[symbol]
+                    size = len(follow)
+                    rest = first_of_sequence(rhs[i + 1 :], firsts)
+                    if EPSILON in rest:
+                        rest.remove(EPSILON)
+                        follow.update(follows[production.lhs])
+                    follow.update(rest)
+                    changed = changed or len(follow) != size
     return follows
 
 
-def get_grammar():
-    productions, start_symbol = compile_productions()
+def compile_grammar(grammar_text):
+    productions, start_symbol = compile_productions(grammar_text)
     terminals, non_terminals, actions = get_terminals_and_non_terminals_and_actions(
         productions
     )
-    firsts = get_firsts()
-    follows = get_follows()
+    firsts = compute_firsts(productions)
+    follows = compute_follows(productions, start_symbol, firsts)
     return Grammar(
         productions, start_symbol, terminals, non_terminals, actions, firsts, follows
     )
 
 
+def replace_file(path, data):
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except OSError:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+def get_grammar_key(grammar_bytes):
+    return hashlib.sha256(grammar_bytes).hexdigest() + f"-{GRAMMAR_CACHE_VERSION}"
+
+
+def get_grammar(grammar_path=GRAMMAR_PATH, cache_path=GRAMMAR_CACHE_PATH):
+    with open(grammar_path, "rb") as f:
+        grammar_bytes = f.read()
+    key = get_grammar_key(grammar_bytes)
+    if key in GRAMMARS:
+        return GRAMMARS[key]
+    try:
+        with open(cache_path, "rb") as f:
+            cached_key, grammar = pickle.load(f)
+        if cached_key == key:
+            GRAMMARS[key] = grammar
+            return grammar
+    except (
+        OSError,
+        pickle.UnpicklingError,
+        EOFError,
+        AttributeError,
+        ValueError,
+        ImportError,
+        ModuleNotFoundError,
+    ):
+        pass
+    grammar = compile_grammar(grammar_bytes.decode("utf-8"))
+    try:
+        replace_file(cache_path, pickle.dumps((key, grammar)))
+    except OSError:
+        pass
+    GRAMMARS[key] = grammar
+    return grammar
+
+
+def get_terminal(token):
+    if token.type in (TokenType.NUM, TokenType.ID):
+        return token.type.value
+    if token.type in (TokenType.KEYWORD, TokenType.SYMBOL, TokenType.EOF):
+        return token.value
+    return None
+
+
 class Parser(object):
-    def __init__(self, lexer):
+    def __init__(self, lexer, build_tree=True):
         self.grammar = get_grammar()
         self.lexer = lexer
         self.errors = []
+        if build_tree:
+            self.internal_node = ParseTreeInternalNode
+            self.leaf_node = ParseTreeLeafNode
+            self.epsilon_node = ParseTreeEpsilonNode
+        else:
+            self.internal_node = self.leaf_node = self.epsilon_node = skip_node
         self.code_generator = CodeGenerator(self, lexer)
+        self.action_handlers = self.code_generator.get_action_handlers(
+            self.grammar.get_actions()
+        )
 
     def parse(self):
         self.lexer.get_next_token()
@@ -252,78 +427,133 @@ class Parser(object):
 
     def parse_node(self, parsing_symbol, depth):
         token = self.lexer.get_current_token()
+        terminal = get_terminal(token)
         if self.grammar.is_terminal(parsing_symbol):
-            if (
-                (
-                    token.type in [TokenType.KEYWORD, TokenType.SYMBOL, TokenType.EOF]
-                    and token.value == parsing_symbol
-                )
-                or (token.type == TokenType.NUM and parsing_symbol == "NUM")
-                or (token.type == TokenType.ID and parsing_symbol == "ID")
-            ):
-                if token.type == TokenType.ID:
-                    self.code_generator.last_id = token.value
-                if token.type == TokenType.NUM:
-                    self.code_generator.last_num = token.value
-                if token.type == TokenType.KEYWORD and token.value in ["int", "void"]:
-                    self.code_generator.last_type = token.value
-                self.lexer.get_next_token()
-                return ParseTreeLeafNode(parsing_symbol, token), False
-            else:
-                error = ParseTreeSyntaxErrorNode(
-                    parsing_symbol, self.lexer.lineno, SyntaxErrorType.MissingSymbol
-                )
-                self.errors.append(error)
-                return error, False
+            return self.match_terminal(parsing_symbol, token, terminal)
         else:
-            production = self.grammar.get_productions(parsing_symbol)
-            for rhs in production.rhs:
-                entry_tokens = self.grammar.entry_tokens_for_rhs(parsing_symbol, rhs)
-                if (
-                    (
-                        token.type
-                        in [TokenType.KEYWORD, TokenType.SYMBOL, TokenType.EOF]
-                        and token.value in entry_tokens
-                    )
-                    or (token.type == TokenType.NUM and "NUM" in entry_tokens)
-                    or (token.type == TokenType.ID and "ID" in entry_tokens)
-                ):
-                    if len(rhs) == 1 and rhs[0] == EPSILON:
-                        return ParseTreeEpsilonNode(parsing_symbol), False
-                    children = []
-                    for symbol in rhs:
-                        if self.grammar.is_action(symbol):
-                            self.code_generator.code_gen(symbol)
-                        else:
-                            sub_root, eof = self.parse_node(symbol, depth + 1)
-                            children.append(sub_root)
-                            if eof:
-                                break
-                    return ParseTreeInternalNode(parsing_symbol, children), eof
-            if token.value in self.grammar.get_follow(parsing_symbol):
-                error = ParseTreeSyntaxErrorNode(
-                    parsing_symbol, self.lexer.lineno, SyntaxErrorType.MissingSymbol
-                )
-                self.errors.append(error)
-                return error, False
+            rhs = self.grammar.predict(parsing_symbol, terminal)
+            if rhs is not None:
+                if len(rhs) == 1 and rhs[0] == EPSILON:
+                    return self.epsilon_node(parsing_symbol), False
+                children = []
+                for symbol in rhs:
+                    handler = self.action_handlers.get(symbol)
+                    if handler is not None:
+                        handler()
+                    else:
+                        sub_root, eof = self.parse_node(symbol, depth + 1)
+                        children.append(sub_root)
+                        if eof:
+                            break
+                return self.internal_node(parsing_symbol, children), eof
+            recovered = self.recover(parsing_symbol, token)
+            if recovered is not None:
+                return recovered
+            sub_root, eof = self.parse_node(parsing_symbol, depth)
+            return sub_root, eof
+
+    def match_terminal(self, parsing_symbol, token, terminal):
+        if terminal == parsing_symbol:
+            if token.type == TokenType.ID:
+                self.code_generator.last_id = token.value
+            if token.type == TokenType.NUM:
+                self.code_generator.last_num = token.value
+            if token.type == TokenType.KEYWORD and token.value in ["int", "void"]:
+                self.code_generator.last_type = token.value
+            self.lexer.get_next_token()
+            return self.leaf_node(parsing_symbol, token), False
+        else:
+            return self.missing_symbol(parsing_symbol), False
+
+    def missing_symbol(self, parsing_symbol):
+        error = ParseTreeSyntaxErrorNode(
+            parsing_symbol,
+            self.lexer.get_current_token().line,
+            SyntaxErrorType.MissingSymbol,
+        )
+        self.errors.append(error)
+        return error
+
+    def recover(self, parsing_symbol, token):
+        if token.value in self.grammar.get_follow(parsing_symbol):
+            return self.missing_symbol(parsing_symbol), False
+        if token.type == TokenType.EOF:
+            error = ParseTreeSyntaxErrorNode(
+                token.value, token.line, SyntaxErrorType.UnexpectedEOF
+            )
+            self.errors.append(error)
+            return error, True
+        self.errors.append(
+            ParseTreeSyntaxErrorNode(
+                token.type.value
+                if token.type in [TokenType.NUM, TokenType.ID]
+                else token.value,
+                token.line,
+                SyntaxErrorType.IllegalSymbol,
+            )
+        )
+        self.lexer.get_next_token()
+        return None
+
+
+class StackFrame(object):
+    def __init__(self, symbol: str, rhs: List[str]):
+        self.symbol = symbol
+        self.rhs = rhs
+        self.position = 0
+        self.children = []
+
+
+class StackParser(Parser):
+    def parse(self):
+        self.lexer.get_next_token()
+        stack = []
+        parsing_symbol = self.grammar.start_symbol
+        while True:
+            if parsing_symbol is not None:
+                result = self.expand(parsing_symbol, stack)
+                parsing_symbol = None
+            else:
+                result = None
+            while result is not None:
+                node, eof = result
+                if not stack:
+                    return ParseTree(node), self.errors
+                frame = stack[-1]
+                frame.children.append(node)
+                if not eof:
+                    break
+                stack.pop()
+                result = self.internal_node(frame.symbol, frame.children), True
+            frame = stack[-1]
+            while frame.position < len(frame.rhs):
+                symbol = frame.rhs[frame.position]
+                frame.position += 1
+                handler = self.action_handlers.get(symbol)
+                if handler is not None:
+                    handler()
+                else:
+                    parsing_symbol = symbol
+                    break
             else:
-                if token.type == TokenType.EOF:
-                    error = ParseTreeSyntaxErrorNode(
-                        token.value, self.lexer.lineno, SyntaxErrorType.UnexpectedEOF
-                    )
-                    self.errors.append(error)
-                    return error, True
-                self.errors.append(
-                    ParseTreeSyntaxErrorNode(
-                        token.type.value
-                        if token.type in [TokenType.NUM, TokenType.ID]
-                        else token.value,
-                        self.lexer.lineno,
-                        SyntaxErrorType.IllegalSymbol,
-                    )
-                )
-                if token.type == TokenType.KEYWORD and token.value == "break":
-                    self.code_generator.code_gen("break_error")
-                self.lexer.get_next_token()
-                sub_root, eof = self.parse_node(parsing_symbol, depth)
-                return sub_root, eof
+                stack.pop()
+                node = self.internal_node(frame.symbol, frame.children)
+                if not stack:
+                    return ParseTree(node), self.errors
+                stack[-1].children.append(node)
+
+    def expand(self, parsing_symbol, stack):
+        while True:
+            token = self.lexer.get_current_token()
+            terminal = get_terminal(token)
+            if self.grammar.is_terminal(parsing_symbol):
+                return self.match_terminal(parsing_symbol, token, terminal)
+            rhs = self.grammar.predict(parsing_symbol, terminal)
+            if rhs is not None:
+                if len(rhs) == 1 and rhs[0] == EPSILON:
+                    return self.epsilon_node(parsing_symbol), False
+                stack.append(StackFrame(parsing_symbol, rhs))
+                return None
+            recovered = self.recover(parsing_symbol, token)
+            if recovered is not None:
+                return recovered
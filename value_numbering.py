@@ -0,0 +1,192 @@
+from peephole import ARITHMETIC_OPS, compact_codes, dense_codes, get_int, install_codes
+from liveness import live_in
+
+COMMUTATIVE_OPS = frozenset(["ADD", "MULT", "EQ"])
+
+
+class ValueNumbering(object):
+    def __init__(self, code_generator):
+        self.code_generator = code_generator
+        self.expression_temps = code_generator.expression_temps
+        self.codes = []
+        self.live = []
+        self.live_across = {}
+        self.values = {}
+        self.holders = {}
+        self.expressions = {}
+        self.value_count = 0
+
+    def optimize(self):
+        codes = dense_codes(self.code_generator)
+        if codes is None:
+            return 0
+        self.codes = codes
+        self.live = live_in(self.codes, self.successors)
+        self.live_across = self.live_across_calls()
+        leaders = sorted(self.leaders())
+        for start, end in zip(leaders, leaders[1:] + [len(self.codes)]):
+            self.number_block(start, end)
+        removed = self.codes.count(None)
+        self.compact()
+        changed = True
+        while changed:
+            self.live = live_in(self.codes, self.successors)
+            for line, code in enumerate(self.codes):
+                if (
+                    code[0] in ARITHMETIC_OPS
+                    and code[3] in self.expression_temps
+                    and code[3] not in self.live_out(line)
+                ):
+                    self.codes[line] = None
+            removed += self.codes.count(None)
+            changed = self.compact()
+        install_codes(self.code_generator, self.codes)
+        return removed
+
+    def compact(self):
+        if None not in self.codes:
+            return False
+        self.codes, _ = compact_codes(self.code_generator, self.codes)
+        return True
+
+    def live_across_calls(self):
+        call_sites = self.code_generator.call_sites
+        state_lines = set()
+        for call_site in call_sites:
+            for line, addr in call_site["saves"] + call_site["restores"]:
+                state_lines.update([line, line + 1])
+        live = live_in(self.codes, self.successors, state_lines)
+        live_across = {}
+        for call_site in call_sites:
+            if call_site["restores"]:
+                live_after = live[call_site["restores"][0][0]]
+                for line, addr in call_site["saves"]:
+                    live_across[line] = live_after
+        return live_across
+
+    def return_points(self):
+        return [
+            int(self.codes[line][1][1:])
+            for line in self.code_generator.code_address_lines
+        ]
+
+    def leaders(self):
+        leaders = {0, *self.return_points()}
+        for line, code in enumerate(self.codes):
+            if code[0] == "JP":
+                leaders.add(line + 1)
+                if get_int(code[1]) is not None:
+                    leaders.add(get_int(code[1]))
+            elif code[0] == "JPF":
+                leaders.update([line + 1, get_int(code[2])])
+        return {line for line in leaders if line is not None and line < len(self.codes)}
+
+    def successors(self, line):
+        code = self.codes[line]
+        if code[0] == "JP":
+            target = get_int(code[1])
+            return self.return_points() if target is None else [target]
+        if code[0] == "JPF":
+            return [line + 1, get_int(code[2])]
+        return [line + 1]
+
+    def live_out(self, line):
+        live_out = set()
+        for successor in self.successors(line):
+            live_out |= self.live[min(successor, len(self.codes))]
+        return live_out
+
+    def new_value(self):
+        self.value_count += 1
+        return self.value_count
+
+    def set_value(self, address, value):
+        self.kill(address)
+        self.values[address] = value
+        self.holders.setdefault(value, set()).add(address)
+
+    def kill(self, address):
+        if address in self.values:
+            self.holders[self.values.pop(address)].discard(address)
+
+    def number(self, operand):
+        if isinstance(operand, str) and operand.startswith("#"):
+            key = ("#", int(operand[1:]))
+            if key not in self.expressions:
+                self.expressions[key] = self.new_value()
+            return self.expressions[key]
+        address = get_int(operand)
+        if address is None:
+            return self.new_value()
+        if address not in self.values:
+            self.set_value(address, self.new_value())
+        return self.values[address]
+
+    def store(self, target, value):
+        address = get_int(target)
+        if address is not None:
+            self.set_value(address, value)
+            return
+        for address in list(self.values):
+            if self.code_generator.is_element(address):
+                self.kill(address)
+
+    def number_block(self, start, end):
+        self.values = {}
+        self.holders = {}
+        self.expressions = {}
+        for line in range(start, end):
+            code = self.codes[line]
+            if code[0] == "ASSIGN":
+                self.store(code[2], self.number(code[1]))
+            elif code[0] in ARITHMETIC_OPS:
+                left, right = self.number(code[1]), self.number(code[2])
+                if code[0] in COMMUTATIVE_OPS and right < left:
+                    left, right = right, left
+                key = (code[0], left, right)
+                value = self.expressions.get(key)
+                target = get_int(code[3])
+                if value is not None and target in self.expression_temps:
+                    holders = self.holders.get(value, set()) - {target}
+                    holder = min(holders) if holders else None
+                    if holder is not None and self.rename(line, end, target, holder):
+                        self.codes[line] = None
+                        self.kill(target)
+                        continue
+                if value is None:
+                    value = self.expressions[key] = self.new_value()
+                self.store(code[3], value)
+
+    def rename(self, line, end, temp, holder):
+        uses = []
+        clobbered = redefined = False
+        for current in range(line + 1, end):
+            code = self.codes[current]
+            operands = [
+                i
+                for i, operand in enumerate(code[1:], 1)
+                if operand is not None
+                and str(operand).lstrip("@") == str(temp)
+                and not (code[0] == "JP" and i == 1 or code[0] == "JPF" and i == 2)
+            ]
+            target = 2 if code[0] == "ASSIGN" else 3 if code[0] in ARITHMETIC_OPS else None
+            reads = [i for i in operands if i != target or str(code[i]).startswith("@")]
+            if reads and clobbered:
+                return False
+            if reads and temp in self.live_across.get(current, ()):
+                return False
+            uses.extend((current, i) for i in reads)
+            if target is not None and get_int(code[target]) == temp:
+                redefined = True
+                break
+            if target is not None and get_int(code[target]) == holder:
+                clobbered = True
+            elif target is not None and str(code[target]).startswith("@"):
+                clobbered = clobbered or self.code_generator.is_element(holder)
+        if not redefined and temp in self.live_out(end - 1):
+            return False
+        for current, i in uses:
+            code = list(self.codes[current])
+            code[i] = f"@{holder}" if str(code[i]).startswith("@") else holder
+            self.codes[current] = tuple(code)
+        return True
@@ -0,0 +1,367 @@
+import argparse
+import sys
+
+IMMEDIATE, DIRECT, INDIRECT, INVALID = range(4)
+OPCODES = ["ASSIGN", "ADD", "SUB", "MULT", "EQ", "LT", "JPF", "JP", "PRINT"]
+ASSIGN, ADD, SUB, MULT, EQ, LT, JPF, JP, PRINT = range(len(OPCODES))
+WORD = 1 << 32
+HALF_WORD = 1 << 31
+STEP_LIMIT = 100_000_000
+MEMORY_LIMIT = 1 << 22
+MEMORY_ERROR = "Invalid access to memory"
+INSTRUCTION_ERROR = "Invalid instruction"
+
+
+class ExecutionError(Exception):
+    pass
+
+
+def load_codes(path):
+    codes = []
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                code = line.rstrip("\n").split("\t", 1)[1]
+                codes.append(tuple(field or None for field in code[1:-1].split(", ")))
+    return codes
+
+
+def wrap(value):
+    return (value + HALF_WORD) % WORD - HALF_WORD
+
+
+class Machine(object):
+    def __init__(self, codes, step_limit=STEP_LIMIT, memory_limit=MEMORY_LIMIT):
+        self.cells = memory_limit // 4
+        self.program = [self.decode(code) for code in codes]
+        self.memory = [None] * self.cells
+        self.step_limit = step_limit
+        self.output = []
+        self.steps = 0
+        self.pc = 0
+
+    def cell(self, address):
+        if address % 4 or not 0 <= address < 4 * self.cells:
+            return None
+        return address // 4
+
+    def decode_operand(self, operand, jump=False):
+        if operand is None:
+            return IMMEDIATE, 0
+        operand = str(operand)
+        if operand.startswith("#"):
+            return IMMEDIATE, int(operand[1:])
+        if jump and not operand.startswith("@"):
+            return IMMEDIATE, int(operand)
+        if jump:
+            operand = operand[1:]
+        mode = INDIRECT if operand.startswith("@") else DIRECT
+        address = operand.lstrip("@")
+        cell = self.cell(int(address)) if address.lstrip("-").isdigit() else None
+        return (INVALID, 0) if cell is None else (mode, cell)
+
+    def decode(self, code):
+        if code is None or code[0] not in OPCODES:
+            return len(OPCODES), IMMEDIATE, 0, IMMEDIATE, 0, IMMEDIATE, 0
+        op = OPCODES.index(code[0])
+        operands = [None, None, None]
+        for i, operand in enumerate(code[1:4]):
+            operands[i] = operand
+        decoded = [op]
+        for i, operand in enumerate(operands):
+            jump = (op == JP and i == 0) or (op == JPF and i == 1)
+            decoded.extend(self.decode_operand(operand, jump))
+        return tuple(decoded)
+
+    def used_memory(self):
+        return self.cells - self.memory.count(None)
+
+    def fetch(self, mode, value):
+        memory = self.memory
+        if mode == INDIRECT:
+            pointer = memory[value]
+            cell = None if pointer is None else self.cell(pointer)
+            if cell is not None and memory[cell] is not None:
+                return memory[cell]
+        raise ExecutionError(MEMORY_ERROR)
+
+    def target(self, mode, value):
+        pointer = self.memory[value] if mode == INDIRECT else None
+        cell = None if pointer is None else self.cell(pointer)
+        if cell is None:
+            raise ExecutionError(MEMORY_ERROR)
+        return cell
+
+    def run(self):
+        if not self.interpret(self.step_limit):
+            raise ExecutionError("Step limit exceeded")
+        return self.output
+
+    def interpret(self, step_limit):
+        program = self.program
+        memory = self.memory
+        output = self.output
+        fetch = self.fetch
+        target = self.target
+        size = len(program)
+        pc = self.pc
+        steps = self.steps
+        halted = True
+        try:
+            for steps in range(self.steps, step_limit):
+                if not 0 <= pc < size:
+                    break
+                op, ma, a, mb, b, mc, c = program[pc]
+                pc += 1
+                x = memory[a] if ma == DIRECT else a if ma == IMMEDIATE else fetch(ma, a)
+                if op == ASSIGN:
+                    if x is None:
+                        raise ExecutionError(MEMORY_ERROR)
+                    if mb == DIRECT:
+                        memory[b] = x
+                    else:
+                        memory[target(mb, b)] = x
+                    continue
+                if op == JP:
+                    if x is None:
+                        raise ExecutionError(MEMORY_ERROR)
+                    pc = x
+                    continue
+                if op == JPF:
+                    if x is None:
+                        raise ExecutionError(MEMORY_ERROR)
+                    if not x:
+                        pc = b
+                    continue
+                if op == PRINT:
+                    if x is None:
+                        raise ExecutionError(MEMORY_ERROR)
+                    output.append(x)
+                    continue
+                y = memory[b] if mb == DIRECT else b if mb == IMMEDIATE else fetch(mb, b)
+                if op == ADD:
+                    z = x + y
+                elif op == SUB:
+                    z = x - y
+                elif op == MULT:
+                    z = x * y
+                elif op == LT:
+                    z = int(x < y)
+                elif op == EQ:
+                    if x is None or y is None:
+                        raise ExecutionError(MEMORY_ERROR)
+                    z = int(x == y)
+                else:
+                    raise ExecutionError(INSTRUCTION_ERROR)
+                if not -HALF_WORD <= z < HALF_WORD:
+                    z = wrap(z)
+                if mc == DIRECT:
+                    memory[c] = z
+                else:
+                    memory[target(mc, c)] = z
+            else:
+                halted = not 0 <= pc < size
+                steps = step_limit
+        except TypeError:
+            self.pc, self.steps = pc - 1, steps
+            raise ExecutionError(MEMORY_ERROR)
+        except ExecutionError:
+            self.pc, self.steps = pc - 1, steps
+            raise
+        self.pc, self.steps = pc, steps
+        return halted
+
+
+class CompiledMachine(Machine):
+    def __init__(self, codes, step_limit=STEP_LIMIT, memory_limit=MEMORY_LIMIT):
+        super().__init__(codes, step_limit, memory_limit)
+        self.source = []
+        self.source_lines = [None]
+        self.function = None
+
+    def leaders(self):
+        size = len(self.program)
+        leaders = {0}
+        for line, (op, ma, a, mb, b, mc, c) in enumerate(self.program):
+            if op == JP or op == JPF:
+                leaders.add(line + 1)
+            if op == JP and ma == IMMEDIATE:
+                leaders.add(a)
+            elif op == JPF and mb == IMMEDIATE:
+                leaders.add(b)
+            elif op == ASSIGN and ma == IMMEDIATE:
+                leaders.add(a)
+            elif op == len(OPCODES):
+                leaders.add(line + 1)
+        return sorted(line for line in leaders if 0 <= line < size)
+
+    def emit(self, depth, text, line=None, offset=None):
+        self.source.append("    " * depth + text)
+        self.source_lines.append(None if line is None else (line, offset))
+
+    def operand(self, depth, mode, value, name, line, offset):
+        if mode == IMMEDIATE:
+            return str(value)
+        if mode == DIRECT:
+            return f"m[{value}]"
+        if mode == INDIRECT:
+            self.emit(depth, f"{name} = m[{value}]", line, offset)
+            self.emit(depth, f"if {name} & 3 or not 0 <= {name} < {4 * self.cells}: fault()", line, offset)
+            return f"m[{name} >> 2]"
+        self.emit(depth, "fault()", line, offset)
+        return "m[0]"
+
+    def checked(self, depth, mode, value, known, line, offset):
+        expression = self.operand(depth, mode, value, "p", line, offset)
+        if mode == INDIRECT or mode == DIRECT and value not in known:
+            self.emit(depth, f"x = {expression}", line, offset)
+            self.emit(depth, "if x is None: fault()", line, offset)
+            if mode == DIRECT:
+                known.add(value)
+            return "x"
+        return expression
+
+    def store(self, depth, mode, value, expression, known, line, offset):
+        destination = self.operand(depth, mode, value, "q", line, offset)
+        self.emit(depth, f"{destination} = {expression}", line, offset)
+        if mode == DIRECT:
+            known.add(value)
+
+    def block(self, depth, start, end):
+        size = end - start
+        self.emit(depth, f"if steps > limit - {size}: return False, {start}, steps")
+        self.emit(depth, f"steps += {size}")
+        known = set()
+        for line in range(start, end):
+            offset = line - end
+            op, ma, a, mb, b, mc, c = self.program[line]
+            if op == ASSIGN:
+                x = self.checked(depth, ma, a, known, line, offset)
+                self.store(depth, mb, b, x, known, line, offset)
+            elif op == JP:
+                x = self.checked(depth, ma, a, known, line, offset)
+                self.emit(depth, f"pc = {x}", line, offset)
+                return
+            elif op == JPF:
+                x = self.checked(depth, ma, a, known, line, offset)
+                self.emit(depth, f"pc = {line + 1} if {x} else {b}", line, offset)
+                return
+            elif op == PRINT:
+                x = self.checked(depth, ma, a, known, line, offset)
+                self.emit(depth, f"output({x})", line, offset)
+            elif op in (ADD, SUB, MULT):
+                x = self.operand(depth, ma, a, "p", line, offset)
+                y = self.operand(depth, mb, b, "r", line, offset)
+                symbol = {ADD: "+", SUB: "-", MULT: "*"}[op]
+                self.emit(depth, f"z = {x} {symbol} {y}", line, offset)
+                z = f"z if {-HALF_WORD} <= z < {HALF_WORD} else wrap(z)"
+                self.store(depth, mc, c, z, known, line, offset)
+            elif op == LT:
+                x = self.operand(depth, ma, a, "p", line, offset)
+                y = self.operand(depth, mb, b, "r", line, offset)
+                self.store(depth, mc, c, f"1 if {x} < {y} else 0", known, line, offset)
+            elif op == EQ:
+                x = self.checked(depth, ma, a, known, line, offset)
+                if x == "x":
+                    self.emit(depth, "y = x", line, offset)
+                    x = "y"
+                y = self.checked(depth, mb, b, known, line, offset)
+                self.store(depth, mc, c, f"1 if {x} == {y} else 0", known, line, offset)
+            else:
+                self.emit(depth, f"raise ExecutionError({INSTRUCTION_ERROR!r})", line, offset)
+                return
+        self.emit(depth, f"pc = {end}")
+
+    def dispatch(self, depth, blocks):
+        if len(blocks) == 1:
+            start, end = blocks[0]
+            self.emit(depth, f"if pc == {start}:")
+            self.block(depth + 1, start, end)
+            self.emit(depth, "else:")
+            self.emit(depth + 1, "return True, pc, steps")
+            return
+        middle = len(blocks) // 2
+        self.emit(depth, f"if pc < {blocks[middle][0]}:")
+        self.dispatch(depth + 1, blocks[:middle])
+        self.emit(depth, "else:")
+        self.dispatch(depth + 1, blocks[middle:])
+
+    def translate(self):
+        leaders = self.leaders()
+        blocks = list(zip(leaders, leaders[1:] + [len(self.program)]))
+        self.emit(0, "def run(m, output, wrap, fault, pc, steps, limit):")
+        self.emit(1, "while True:")
+        if blocks:
+            self.dispatch(2, blocks)
+        else:
+            self.emit(2, "return True, pc, steps")
+        namespace = {"ExecutionError": ExecutionError}
+        exec(compile("\n".join(self.source), "<translated>", "exec"), namespace)
+        return namespace["run"]
+
+    def run(self):
+        if self.function is None:
+            self.function = self.translate()
+        size = len(self.program)
+        while True:
+            try:
+                unknown, self.pc, self.steps = self.function(
+                    self.memory,
+                    self.output.append,
+                    wrap,
+                    fault,
+                    self.pc,
+                    self.steps,
+                    self.step_limit,
+                )
+            except (ExecutionError, TypeError) as e:
+                self.locate(e.__traceback__)
+                if isinstance(e, TypeError):
+                    raise ExecutionError(MEMORY_ERROR)
+                raise
+            if not 0 <= self.pc < size:
+                return self.output
+            limit = min(self.steps + 1, self.step_limit) if unknown else self.step_limit
+            if self.interpret(limit):
+                return self.output
+            if self.steps >= self.step_limit:
+                raise ExecutionError("Step limit exceeded")
+
+    def locate(self, traceback):
+        while traceback.tb_frame.f_code.co_filename != "<translated>":
+            traceback = traceback.tb_next
+        self.pc, offset = self.source_lines[traceback.tb_lineno]
+        self.steps = traceback.tb_frame.f_locals["steps"] + offset
+
+
+def fault():
+    raise ExecutionError(MEMORY_ERROR)
+
+
+def execute(machine, stream=sys.stdout):
+    error = None
+    try:
+        machine.run()
+    except ExecutionError as e:
+        error = e
+    for value in machine.output:
+        stream.write(f"PRINT    {value}\n")
+    if error is not None:
+        faulted = str(error) == MEMORY_ERROR and machine.program[machine.pc][0] == PRINT
+        prefix = "PRINT    " if faulted else ""
+        stream.write(f"{prefix}ERROR : {error}\n")
+        return False
+    stream.write(f"Total memory used: {machine.used_memory()}\n")
+    return True
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("path", nargs="?", default="output.txt")
+    arg_parser.add_argument("--steps", type=int, default=STEP_LIMIT)
+    arg_parser.add_argument("--memory", type=int, default=MEMORY_LIMIT)
+    arg_parser.add_argument("--compile", action="store_true")
+    args = arg_parser.parse_args()
+    machine_class = CompiledMachine if args.compile else Machine
+    machine = machine_class(load_codes(args.path), args.steps, args.memory)
+    sys.exit(0 if execute(machine) else 1)
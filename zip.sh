@@ -3,5 +3,7 @@
 rm ./phase_4.zip
 rm output.txt
 rm parse_tree.txt
+rm grammar/grammar.cache
+rm generated_parser.py
 rm -rf __pycache__
 zip -r -X ./phase_4.zip *